@@ -9,35 +9,47 @@ Usage:
     python main.py --help   # Show help
 """
 import sys
-from dotenv import load_dotenv
 
-load_dotenv()
+def _show_help():
+    print(__doc__)
+    print("The agent can:")
+    print("  • Search your knowledge base")
+    print("  • Save new memories")
+    print("  • Sync folders to memory")
+    print("  • Upload individual files")
+    print("  • List and delete documents")
+    print()
+    print("Just chat naturally - the agent decides which tools to use!")
+
+
+def _show_version():
+    print("Ruty v0.2.0 (LangGraph)")
+
+
+# Flags handled without starting the chat
+_ARG_DISPATCH = {
+    "--help": _show_help,
+    "-h": _show_help,
+    "--version": _show_version,
+}
+
 
 def main():
     """Main entry point for Ruty"""
     if len(sys.argv) > 1:
-        arg = sys.argv[1]
-        
-        if arg in ["--help", "-h"]:
-            print(__doc__)
-            print("The agent can:")
-            print("  • Search your knowledge base")
-            print("  • Save new memories")
-            print("  • Sync folders to memory")
-            print("  • Upload individual files")
-            print("  • List and delete documents")
-            print()
-            print("Just chat naturally - the agent decides which tools to use!")
-            return
-        
-        if arg == "--version":
-            print("Ruty v0.2.0 (LangGraph)")
+        handler = _ARG_DISPATCH.get(sys.argv[1])
+        if handler:
+            handler()
             return
     
+    # Heavy imports only once we actually start chatting
+    from dotenv import load_dotenv
+    load_dotenv()
+    
     # Run interactive chat
-    from ruty.cli import interactive_chat
-    interactive_chat()
+    from ruty.cli import main as cli_main
+    cli_main()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -7,10 +7,16 @@ cd "$(dirname "$(readlink -f "$0")")"
 # 2. Log execution attempt (for debugging)
 echo "$(date): Run triggered with args: $@" >> /tmp/ruty_debug.log
 
-# 3. Add user bin to PATH (where uv lives)
+# 3. Use the project venv's Python directly once uv has created it; the
+#    hotkey runs this on every press and uv re-resolves the env each time
+if [ -x .venv/bin/python ]; then
+    exec .venv/bin/python tray.py "$@"
+fi
+
+# 4. Add user bin to PATH (where uv lives)
 export PATH="$HOME/.local/bin:$PATH"
 
-# 4. Run with absolute path to uv
+# 5. Run with absolute path to uv
 if command -v uv >/dev/null; then
     exec uv run python tray.py "$@"
 else
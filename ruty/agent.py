@@ -4,20 +4,24 @@ A personal AI assistant with memory, supporting multiple LLM providers
 and persistent conversation history.
 """
 import os
+import time
+import uuid
 import sqlite3
+import threading
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
-from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langchain_openai import ChatOpenAI
-
-from .state import AgentState
-from .tools import ALL_TOOLS
+from typing import TYPE_CHECKING
+
 from .providers import get_config, PROVIDERS
+from .config import ensure_env
+
+# LangChain / LangGraph are heavy to import; they are loaded inside the
+# functions that need them so importing this module stays cheap.
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
-load_dotenv()
+# Checkpoint settings below come from the environment
+ensure_env()
 
 # System prompt for the agent
 SYSTEM_PROMPT = """You are Ruty, a personal AI assistant with access to a knowledge base.
@@ -28,6 +32,7 @@ You have the following capabilities through your tools:
 - **sync_folder**: Upload all files from a folder to your knowledge base
 - **upload_file**: Upload a single file to your knowledge base
 - **load_local_context**: Temporarily load local files for the current conversation
+- **read_context_file**: Read a file listed in the local context (the user's /context directory)
 - **list_documents**: List all documents in your knowledge base
 - **delete_document**: Delete a document from your knowledge base
 - **open_url**: Open a URL in the user's default browser
@@ -44,8 +49,89 @@ Guidelines:
 8. For system tasks, use run_shell cautiously and explain what you're doing
 """
 
+# Fixed system message, shared by every assistant turn (never mutated).
+# It is sent byte-identical on every call, followed by the tool schemas and
+# the slow-changing local context / summary, so providers with automatic
+# prefix caching (OpenAI, Groq) can reuse the prefill.
+_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Anthropic models (via OpenRouter) only cache prefixes marked explicitly
+_CACHED_SYSTEM_MSG = {
+    "role": "system",
+    "content": [{
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"},
+    }],
+}
+
+# Token budget for conversation history sent with each LLM call; anything
+# older is folded into a running summary
+MAX_HISTORY_TOKENS = 4000
+# Never window below this many recent messages, whatever their size
+MIN_HISTORY_MESSAGES = 2
+# Messages pushed out of the window are summarized in batches this large
+SUMMARY_BATCH_TOKENS = 1500
+
+# Compiled graphs keyed by (id(checkpointer), id(config)). Values keep the
+# key objects alive so their ids cannot be reused while cached.
+_AGENT_CACHE_SIZE = 4
+_agent_cache: dict = {}
+
 # SQLite database for conversation persistence
-DB_PATH = Path.home() / ".config" / "ruty" / "conversations.db"
+DB_PATH = Path(os.getenv("RUTY_CHECKPOINT_DB") or Path.home() / ".config" / "ruty" / "conversations.db")
+DB_PATH_STR = str(DB_PATH)
+
+# Threads with no checkpoint newer than this are pruned (default 7 days)
+CHECKPOINT_TTL = int(os.getenv("RUTY_CHECKPOINT_TTL", 7 * 24 * 3600))
+
+# Read connections pooled by the persistent checkpointer
+CHECKPOINT_READERS = 4
+
+# Offset between the UUIDv6 epoch (1582-10-15) and Unix time, in 100ns ticks
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def _checkpoint_time(checkpoint_id: str) -> float:
+    """Unix timestamp encoded in a LangGraph (UUIDv6) checkpoint id."""
+    value = uuid.UUID(checkpoint_id).int
+    ticks = ((value >> 80) << 12) | ((value >> 64) & 0x0FFF)
+    return (ticks - _UUID_EPOCH_OFFSET) / 1e7
+
+
+def prune_checkpoints(conn: sqlite3.Connection, ttl: int = CHECKPOINT_TTL) -> int:
+    """Delete every thread whose newest checkpoint is older than ttl seconds.
+    
+    Returns:
+        Number of threads removed.
+    """
+    cutoff = time.time() - ttl
+    try:
+        rows = conn.execute(
+            "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return 0  # Tables not created yet
+    
+    stale = []
+    for thread_id, checkpoint_id in rows:
+        try:
+            if _checkpoint_time(checkpoint_id) < cutoff:
+                stale.append((thread_id,))
+        except ValueError:
+            continue
+    
+    if stale:
+        with conn:
+            conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", stale)
+            conn.executemany("DELETE FROM writes WHERE thread_id = ?", stale)
+    return len(stale)
+
+
+@lru_cache(maxsize=None)
+def _ensure_db_dir():
+    """Create the checkpoint database directory (once per process)."""
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
 def get_checkpointer(persistent: bool = True):
@@ -58,28 +144,57 @@ def get_checkpointer(persistent: bool = True):
         A LangGraph checkpointer instance.
     """
     if persistent:
-        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        # Use sqlite3.connect with check_same_thread=False for thread safety
-        conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
-        return SqliteSaver(conn)
+        from .checkpoint import PooledSqliteSaver
+        
+        _ensure_db_dir()
+        # WAL writer + pooled readers so checkpoint reads don't queue behind writes
+        saver = PooledSqliteSaver.from_path(DB_PATH_STR, pool_size=CHECKPOINT_READERS)
+        # Keep the database bounded by dropping long-idle threads
+        if CHECKPOINT_TTL > 0:
+            prune_checkpoints(saver.conn)
+        return saver
+    
+    from langgraph.checkpoint.memory import MemorySaver
     return MemorySaver()
 
 
-def create_llm(config=None, api_key_override: str = None):
-    """Create an LLM instance based on configuration.
-    
-    Args:
-        config: RutyConfig instance (uses global if None)
-        api_key_override: Override API key for this request
+# Persistent saver shared by every agent built without an explicit
+# checkpointer, so rebuilds (provider changes, cache evictions) reuse its
+# connections instead of opening another writer and reader pool each time
+_shared_checkpointer = None
+_shared_checkpointer_lock = threading.Lock()
+
+
+def shared_checkpointer():
+    """The process-wide persistent checkpointer, opened on first use."""
+    global _shared_checkpointer
+    with _shared_checkpointer_lock:
+        if _shared_checkpointer is None:
+            _shared_checkpointer = get_checkpointer(persistent=True)
+        return _shared_checkpointer
+
+
+def close_shared_checkpointer():
+    """Close the shared checkpointer, if it was opened (at process exit)."""
+    global _shared_checkpointer
+    with _shared_checkpointer_lock:
+        if _shared_checkpointer is not None:
+            _agent_cache.clear()
+            _agents.clear()
+            _shared_checkpointer.close()
+            _shared_checkpointer = None
+
+
+def _llm_params(config=None, api_key_override: str = None, light: bool = False) -> tuple:
+    """Resolve the (model, api_key, base_url) triple for the current provider.
     
-    Returns:
-        A ChatOpenAI instance configured for the selected provider.
+    With light=True the provider's light_model is used, if it has one.
     """
     if config is None:
         config = get_config()
     
     provider = config.current_provider
-    model = config.current_model
+    model = (light and provider.light_model) or config.current_model
     api_key = api_key_override or config.current_api_key
     
     # For providers that don't require keys (Ollama), use dummy
@@ -90,106 +205,266 @@ def create_llm(config=None, api_key_override: str = None):
     if not api_key:
         api_key = "missing-key-placeholder"
     
+    return model, api_key, provider.base_url
+
+
+def create_llm(config=None, api_key_override: str = None):
+    """Create an LLM instance based on configuration.
+    
+    Args:
+        config: RutyConfig instance (uses global if None)
+        api_key_override: Override API key for this request
+    
+    Returns:
+        A ChatOpenAI instance configured for the selected provider.
+    """
+    return _cached_chat_model(*_llm_params(config, api_key_override))
+
+
+@lru_cache(maxsize=1)
+def _tool_schemas() -> tuple:
+    """OpenAI-format schemas for ALL_TOOLS, introspected once per process."""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+    from .tools import ALL_TOOLS
+    
+    return tuple(convert_to_openai_tool(t) for t in ALL_TOOLS)
+
+
+@lru_cache(maxsize=8)
+def _bound_llm(model: str, api_key: str, base_url: str):
+    """Chat model with ALL_TOOLS bound, built once per (model, key, endpoint)."""
+    return _cached_chat_model(model, api_key, base_url).bind_tools(list(_tool_schemas()))
+
+
+@lru_cache(maxsize=8)
+def _cached_chat_model(model: str, api_key: str, base_url: str) -> "ChatOpenAI":
+    """Build a ChatOpenAI once per (model, key, endpoint).
+    
+    Reusing the instance keeps its underlying HTTP client and connection
+    pool alive across turns instead of re-handshaking every time.
+    """
+    from langchain_openai import ChatOpenAI
+    
     return ChatOpenAI(
         model=model,
         api_key=api_key,
-        base_url=provider.base_url,
+        base_url=base_url,
         temperature=0.7,
         max_tokens=2000,
     )
 
 
+def warm_up(config=None):
+    """Build the tool-bound model for the current provider ahead of time.
+    
+    Pays the langchain_openai import, client construction and tool schema
+    conversion up front; the first assistant step then hits _bound_llm's
+    cache. Meant to run on a background thread while the user types.
+    """
+    _bound_llm(*_llm_params(config))
+
+
+def _window_start(conversation: list) -> int:
+    """Index of the oldest message that fits in MAX_HISTORY_TOKENS.
+    
+    The window never starts on a ToolMessage, whose tool call would be cut
+    off, and always keeps at least MIN_HISTORY_MESSAGES.
+    """
+    from langchain_core.messages import ToolMessage
+    from langchain_core.messages.utils import count_tokens_approximately
+    
+    start = len(conversation)
+    used = 0
+    while start > 0:
+        cost = count_tokens_approximately([conversation[start - 1]])
+        if used + cost > MAX_HISTORY_TOKENS and len(conversation) - start >= MIN_HISTORY_MESSAGES:
+            break
+        used += cost
+        start -= 1
+    
+    while start < len(conversation) - 1 and isinstance(conversation[start], ToolMessage):
+        start += 1
+    return start
+
+
 def create_agent(checkpointer=None, config=None):
     """Build and return the LangGraph agent.
     
     Args:
-        checkpointer: Optional persistence layer (defaults to SQLite)
+        checkpointer: Optional persistence layer (defaults to the shared
+            SQLite checkpointer)
         config: Optional RutyConfig override
         
     Returns:
         Compiled LangGraph agent with checkpointing
+    
+    Graphs are memoized per (checkpointer, config) pair, so repeated calls
+    with the same arguments return the already-compiled agent.
     """
+    cache_key = (id(checkpointer), id(config))
+    cached = _agent_cache.get(cache_key)
+    if cached is not None:
+        return cached[-1]
+    checkpointer_arg, config_arg = checkpointer, config
+    
+    from langgraph.graph import StateGraph, START, END
+    from langgraph.prebuilt import ToolNode, tools_condition
+    from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+    from langchain_core.runnables import RunnableLambda
+    from langchain_core.messages.utils import count_tokens_approximately
+    from .state import AgentState
+    from .tools import ALL_TOOLS
+    from .tools.memory import prefetch_memories
+    from .extraction import summarize_conversation
+    from .config import api_key_context
+    
     if config is None:
         config = get_config()
     
     # Define the assistant node (reasoning)
-    def assistant(state: AgentState):
-        """The reasoning node - processes messages and decides actions"""
-        from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-        from .config import api_key_context
+    def current_api_key():
+        """API key for the active provider (request context, then config)"""
+        return api_key_context.get().get(config.provider) or config.current_api_key
+    
+    # Define the compaction node (runs before every assistant step)
+    def trim(state: AgentState):
+        """Fold messages that left the token window into the running summary.
         
-        # Get API key from context or config
-        ctx_keys = api_key_context.get()
-        provider_id = config.provider
-        api_key = ctx_keys.get(provider_id) or config.current_api_key
+        Folded messages are deleted from state with RemoveMessage, so the
+        checkpoint stays O(window) instead of O(session). Overflow is only
+        summarized once it reaches SUMMARY_BATCH_TOKENS, so the extra LLM call
+        happens occasionally rather than every turn.
+        """
+        conversation = state["messages"]
+        overflow = conversation[:_window_start(conversation)]
+        if not overflow or count_tokens_approximately(overflow) < SUMMARY_BATCH_TOKENS:
+            return {}
         
-        # Create LLM with current config
-        llm = create_llm(config, api_key_override=api_key).bind_tools(ALL_TOOLS)
+        summary = summarize_conversation(
+            overflow,
+            state.get("summary") or "",
+            create_llm(config, api_key_override=current_api_key()),
+        )
+        if summary is None:
+            return {}  # Keep the messages rather than lose them
+        return {
+            "summary": summary,
+            "messages": [RemoveMessage(id=msg.id) for msg in overflow],
+        }
+    
+    def prepare(state: AgentState, light: bool = False):
+        """Pick the tool-bound LLM and assemble the prompt for one step"""
+        # The opening message of a thread often leads to a memory search, so
+        # start the (query-independent) memory listing now to overlap the LLM
+        # call. Later turns skip it: the listing covers the whole knowledge
+        # base, too much to fetch for turns that may never search.
+        last = state["messages"][-1] if state["messages"] else None
+        if (
+            isinstance(last, HumanMessage)
+            and not state.get("summary")
+            and not any(isinstance(m, AIMessage) for m in state["messages"])
+        ):
+            prefetch_memories()
         
-        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        # Reuse the tool-bound LLM for the current provider/model/key
+        params = _llm_params(config, api_key_override=current_api_key(), light=light)
+        llm = _bound_llm(*params)
         
-        # Add local context if available
+        if config.provider == "openrouter" and params[0].startswith("anthropic/"):
+            messages = [_CACHED_SYSTEM_MSG]
+        else:
+            messages = [_SYSTEM_MSG]
+        
+        # Add local context if available (stable per session, so it stays
+        # ahead of the summary and the conversation in the cached prefix)
         if state.get("local_context"):
             messages.append({
                 "role": "system", 
                 "content": f"[Local Context]\n{state['local_context']}"
             })
         
-        # Aggressive trimming: keep only last 6 messages to stay under context limits
-        MAX_MESSAGES = 6
-        conversation = state["messages"]
-        if len(conversation) > MAX_MESSAGES:
-            conversation = conversation[-MAX_MESSAGES:]
-        
-        messages.extend(conversation)
-        
-        # Get LLM response
-        response = llm.invoke(messages)
-        
-        return {"messages": [response]}
+        # Older turns live on only as the summary written by trim
+        if state.get("summary"):
+            messages.append({
+                "role": "system",
+                "content": f"[Earlier conversation summary]\n{state['summary']}"
+            })
+        messages.extend(state["messages"])
+        return llm, messages
+    
+    def is_light(run_config) -> bool:
+        """Whether the caller routed this run to the provider's light model"""
+        return (run_config or {}).get("configurable", {}).get("model_tier") == "light"
+    
+    # Define the assistant node (reasoning). The parameter must be named
+    # "config" for RunnableLambda to pass the run config in.
+    def assistant(state: AgentState, config):
+        """The reasoning node - processes messages and decides actions"""
+        llm, messages = prepare(state, is_light(config))
+        return {"messages": [llm.invoke(messages)]}
+    
+    async def aassistant(state: AgentState, config):
+        """Async reasoning node, used by astream / astream_events: the LLM
+        request is awaited on the event loop instead of holding a worker
+        thread for the whole generation"""
+        llm, messages = prepare(state, is_light(config))
+        return {"messages": [await llm.ainvoke(messages)]}
     
     # Build the graph
     graph = StateGraph(AgentState)
     
     # Add nodes
-    graph.add_node("assistant", assistant)
+    graph.add_node("trim", trim)
+    graph.add_node("assistant", RunnableLambda(assistant, afunc=aassistant))
     graph.add_node("tools", ToolNode(ALL_TOOLS))
     
-    # Define edges (ReAct loop)
-    graph.add_edge(START, "assistant")
+    # Define edges (ReAct loop, compacting history before each reasoning step)
+    graph.add_edge(START, "trim")
+    graph.add_edge("trim", "assistant")
     graph.add_conditional_edges(
         "assistant",
         tools_condition,  # Routes to "tools" if tool call, else END
     )
-    graph.add_edge("tools", "assistant")  # Loop back after tool execution
+    graph.add_edge("tools", "trim")  # Loop back after tool execution
     
     # Compile with checkpointer
     if checkpointer is None:
-        checkpointer = get_checkpointer(persistent=True)
-        
-    return graph.compile(checkpointer=checkpointer)
+        checkpointer = shared_checkpointer()
+    
+    compiled = graph.compile(checkpointer=checkpointer)
+    if len(_agent_cache) >= _AGENT_CACHE_SIZE:
+        _agent_cache.pop(next(iter(_agent_cache)))
+    _agent_cache[cache_key] = (checkpointer_arg, config_arg, compiled)
+    return compiled
 
 
-# Singleton agent instance
-_agent = None
+# Singleton agents, keyed by whether their checkpoints persist to SQLite
+_agents: dict = {}
 
 
-def get_agent(force_new: bool = False):
+def get_agent(force_new: bool = False, persistent: bool = True):
     """Get or create the singleton agent instance.
     
     Args:
         force_new: Force creation of a new agent (e.g., after config change)
+        persistent: Keep conversations in SQLite (False keeps them in memory)
     
     Returns:
         Compiled LangGraph agent
     """
-    global _agent
-    if _agent is None or force_new:
-        _agent = create_agent()
-    return _agent
+    if force_new:
+        _agents.clear()
+        _agent_cache.clear()
+    if persistent not in _agents:
+        checkpointer = shared_checkpointer() if persistent else get_checkpointer(persistent=False)
+        _agents[persistent] = create_agent(checkpointer=checkpointer)
+    return _agents[persistent]
 
 
 def reset_agent():
     """Reset the agent (useful after config changes)."""
-    global _agent
-    _agent = None
+    _agents.clear()
+    _agent_cache.clear()
+    # Drop models (and their HTTP clients) built for the old provider/key
+    _bound_llm.cache_clear()
+    _cached_chat_model.cache_clear()
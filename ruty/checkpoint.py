@@ -0,0 +1,123 @@
+"""SQLite checkpointer with WAL mode and a pool of read connections.
+
+SqliteSaver funnels every read and write through one connection guarded by
+one lock. In WAL mode SQLite lets readers run alongside a writer, so reads
+(get_tuple / list) here check out their own connection from a small pool
+while writes keep going through the single writer connection.
+
+The async checkpoint API is also provided (by running the sync methods in
+a worker thread) so the same saver works with astream / astream_events.
+"""
+import asyncio
+import queue
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# Applied to every connection; WAL itself is persisted in the database file
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    # Truncate the WAL back to 64 MB after checkpoints, so a long-running
+    # process doesn't keep a WAL sized for its largest burst of writes
+    "PRAGMA journal_size_limit=67108864",
+)
+
+# Seconds a read waits for a pooled connection before using the writer;
+# list() keeps its reader checked out until the generator is exhausted, so
+# a few abandoned iterators must not block every other read
+READER_TIMEOUT = 1.0
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Open a connection usable from any thread, with PRAGMAs applied."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PooledSqliteSaver(SqliteSaver):
+    """SqliteSaver whose reads use pooled connections instead of the writer.
+
+    Writes (put / put_writes / delete_thread) still go through the writer
+    connection under SqliteSaver's lock.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, readers: list, **kwargs):
+        super().__init__(conn, **kwargs)
+        self._pool_size = len(readers)
+        self._all_readers = list(readers)
+        self._readers: queue.Queue = queue.Queue()
+        for reader in readers:
+            self._readers.put(reader)
+
+    @classmethod
+    def from_path(cls, path: Path, pool_size: int = 4) -> "PooledSqliteSaver":
+        """Open the writer and pool_size reader connections for path.
+
+        A ":memory:" database gets no readers, since every connection to it
+        would be a separate, empty database.
+        """
+        path = str(path)
+        if path == ":memory:":
+            return cls(sqlite3.connect(path, check_same_thread=False), [])
+        return cls(_connect(path), [_connect(path) for _ in range(pool_size)])
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        if transaction or self._pool_size == 0:
+            with super().cursor(transaction=transaction) as cur:
+                yield cur
+            return
+
+        # Tables must exist before a reader can query them
+        if not self.is_setup:
+            with self.lock:
+                self.setup()
+
+        try:
+            reader = self._readers.get(timeout=READER_TIMEOUT)
+        except queue.Empty:
+            # Pool exhausted; read through the writer (under its lock) instead
+            with super().cursor(transaction=False) as cur:
+                yield cur
+            return
+        cur = reader.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+            self._readers.put(reader)
+
+    def close(self):
+        """Close the writer and every reader connection, checked out or not."""
+        for reader in self._all_readers:
+            reader.close()
+        self.conn.close()
+
+    # Async API: run the sync implementation off the event loop
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        tuples = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await asyncio.to_thread(self.delete_thread, thread_id)
@@ -1,41 +1,50 @@
 """Interactive CLI for Ruty"""
 import os
+import sys
 import uuid
+import threading
 from pathlib import Path
 from datetime import datetime
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import HumanMessage, AIMessage
 
-from .agent import create_agent
-from .memory import read_directory_context, add_memory_to_supermemory
+from .agent import get_agent, warm_up
+from .memory import read_file_context, build_context_index, format_context_index, add_memory_to_supermemory
 from .extraction import extract_semantic_memories
 
 
-def save_session_history(messages, session_id):
-    """Save extracted insights to Supermemory (if not already saved by agent)"""
-    # Check if agent already saved memories during the session
-    from langchain_core.messages import AIMessage, ToolMessage
+# Completed turns after which older history is rolled over to Supermemory
+HISTORY_FLUSH_TURNS = 50
+
+
+def save_session_history(messages, session_id, part=None, verbose=True, already_saved=False):
+    """Save extracted insights to Supermemory (if not already saved by agent)
+    
+    Args:
+        messages: Messages to analyze
+        session_id: Session the messages belong to
+        part: Optional part number when a long session is saved in pieces
+        verbose: Print progress (disabled for background saves)
+        already_saved: The agent saved memories itself (AgentState.memories_saved)
     
-    # Look for add_memory tool calls
-    already_saved = any(
-        hasattr(msg, 'tool_calls') and msg.tool_calls and 
-        any(tc.get('name') == 'add_memory' for tc in msg.tool_calls)
-        for msg in messages if isinstance(msg, AIMessage)
-    )
+    Returns:
+        True if new insights were saved
+    """
+    log = print if verbose else (lambda *args, **kwargs: None)
     
     if already_saved:
-        print(f"\n✓ Memories already saved during session (skipping extraction)")
+        log(f"\n✓ Memories already saved during session (skipping extraction)")
         return
     
-    print(f"\n🧠 Analyzing session for long-term memories...")
+    log(f"\n🧠 Analyzing session for long-term memories...")
     
     # Extract semantic memories
     extracted_content = extract_semantic_memories(messages)
     
     if not extracted_content:
-        print("✓ No significant memories to save.")
+        log("✓ No significant memories to save.")
         return
         
-    print(f"📝 Extracted insights:\n{extracted_content}\n")
+    log(f"📝 Extracted insights:\n{extracted_content}\n")
     
     # Generate title
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
@@ -43,28 +52,91 @@ def save_session_history(messages, session_id):
     
     # Save the *extracted* content, not the raw log
     final_content = f"Session ID: {session_id}\nDate: {timestamp}\n\n{extracted_content}"
+    custom_id = f"mem_{session_id}" if part is None else f"mem_{session_id}_part{part}"
     
-    result = add_memory_to_supermemory(final_content, custom_id=f"mem_{session_id}", title=title)
+    result = add_memory_to_supermemory(final_content, custom_id=custom_id, title=title)
     
     if result:
-        print(f"✓ Saved insights to Supermemory")
+        log(f"✓ Saved insights to Supermemory")
     else:
-        print(f"✗ Failed to save insights")
+        log(f"✗ Failed to save insights")
+    return bool(result)
 
 
-def interactive_chat():
-    """Run interactive chat with the LangGraph agent"""
+_ansi_supported = None
+
+
+def _clear_screen():
+    """Clear the terminal with an ANSI escape instead of spawning clear/cls"""
+    global _ansi_supported
+    if _ansi_supported is None:
+        _ansi_supported = sys.stdout.isatty()
+        if _ansi_supported and os.name == 'nt':
+            # Enable ENABLE_VIRTUAL_TERMINAL_PROCESSING on Windows consoles
+            try:
+                import ctypes
+                kernel32 = ctypes.windll.kernel32
+                handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+                mode = ctypes.c_uint32()
+                _ansi_supported = bool(
+                    kernel32.GetConsoleMode(handle, ctypes.byref(mode))
+                    and kernel32.SetConsoleMode(handle, mode.value | 0x0004)
+                )
+            except Exception:
+                _ansi_supported = False
     
-    # Use in-memory storage (no persistence)
-    agent = create_agent()  # Uses default MemorySaver
+    if _ansi_supported:
+        sys.stdout.write("\x1b[H\x1b[2J")
+        sys.stdout.flush()
+    else:
+        os.system('clear' if os.name != 'nt' else 'cls')
+
+
+def _finish_session_save(messages, session_id, part, pending_threads, already_saved):
+    """Background exit-time save: wait for roll-overs, then save the tail"""
+    for thread in pending_threads:
+        thread.join(timeout=30)
+    if save_session_history(messages, session_id, part, verbose=False, already_saved=already_saved):
+        print("✓ Saved session insights to Supermemory", file=sys.stderr)
+
+
+def _warmup():
+    """Background warm-up of the model client (best effort)"""
+    try:
+        warm_up()
+    except Exception:
+        pass  # The first turn will build it and report any error
+
+
+def interactive_chat(persistent: bool = True):
+    """Run interactive chat with the LangGraph agent
+    
+    Args:
+        persistent: Keep conversation checkpoints in SQLite across runs
+    """
+    
+    # Shared compiled agent (each session gets its own thread)
+    agent = get_agent(persistent=persistent)
+    
+    # Load the chat model while the user types their first message
+    threading.Thread(target=_warmup, daemon=True).start()
     
     # Create session ID for this session
     session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
     config = {"configurable": {"thread_id": session_id}}
     
-    # Local context state
+    # Local context state: a directory is indexed by name and read lazily
+    # through the read_context_file tool
     local_context = ""
-    context_path = None
+    local_context_index = {}
+    context_changed = False
+    prompt = "You: "  # Rebuilt only when the context changes
+    
+    # Long sessions are saved in parts so the exit-time save stays small
+    turns = 0
+    saved_ids = set()  # Messages already handed to a background save
+    part = 0
+    flush_threads = []
     
     print("\n🧠 Ruty - LangGraph Agent")
     print("=" * 40)
@@ -81,11 +153,6 @@ def interactive_chat():
     try:
         while True:
             try:
-                # Show context indicator in prompt
-                if context_path:
-                    prompt = f"You [{context_path.name}]: "
-                else:
-                    prompt = "You: "
                 user_input = input(prompt).strip()
             except (KeyboardInterrupt, EOFError):
                 print("\nGoodbye!")
@@ -104,26 +171,29 @@ def interactive_chat():
                     print("Goodbye!")
                     break
                 elif cmd == "/clear":
-                    os.system('clear' if os.name != 'nt' else 'cls')
+                    _clear_screen()
                     continue
                 elif cmd == "/context":
                     if not arg or arg.lower() == "clear":
                         local_context = ""
-                        context_path = None
+                        local_context_index = {}
+                        context_changed = True
+                        prompt = "You: "
                         print("✓ Local context cleared")
                     else:
                         path = Path(arg).expanduser().resolve()
                         if path.exists():
                             try:
                                 if path.is_file():
-                                    content = path.read_text(encoding="utf-8")
-                                    local_context = f"### {path.name}\n```\n{content[:5000]}\n```"
-                                    context_path = path
+                                    local_context = read_file_context(path)
+                                    local_context_index = {}
                                     print(f"✓ Loaded: {path.name}")
                                 else:
-                                    local_context = read_directory_context(path)
-                                    context_path = path
-                                    print(f"✓ Loaded files from: {path.name}")
+                                    local_context_index = build_context_index(path)
+                                    local_context = format_context_index(path, local_context_index)
+                                    print(f"✓ Indexed {len(local_context_index)} files from: {path.name}")
+                                context_changed = True
+                                prompt = f"You [{path.name}]: "
                             except Exception as e:
                                 print(f"Error reading: {e}")
                         else:
@@ -136,34 +206,57 @@ def interactive_chat():
             # Process with agent
             print()
             try:
-                # Stream events to show tool usage
-                final_response = None
-                
-                # Build input state with local context
+                # Build input state; context is only sent when it changed,
+                # the checkpoint keeps it for the following turns
                 input_state = {"messages": [HumanMessage(content=user_input)]}
-                if local_context:
+                if context_changed:
                     input_state["local_context"] = local_context
+                    input_state["local_context_index"] = local_context_index
+                    context_changed = False
                 
-                for event in agent.stream(
+                # Stream LLM tokens as they arrive so the reply starts
+                # printing at time-to-first-token, not at completion
+                answering = False
+                for chunk, metadata in agent.stream(
                     input_state,
                     config=config,
-                    stream_mode="values"
+                    stream_mode="messages"
                 ):
-                    if "messages" in event:
-                        last_msg = event["messages"][-1]
-                        
-                        # Show tool calls
-                        if hasattr(last_msg, "tool_calls") and last_msg.tool_calls:
-                            for tc in last_msg.tool_calls:
-                                print(f"  🔧 Using: {tc['name']}")
-                        
-                        # Capture final response
-                        if hasattr(last_msg, "content") and last_msg.content:
-                            if not hasattr(last_msg, "tool_calls") or not last_msg.tool_calls:
-                                final_response = last_msg.content
+                    if metadata.get("langgraph_node") != "assistant":
+                        continue
+                    
+                    # Show tool calls
+                    for tc in getattr(chunk, "tool_call_chunks", None) or []:
+                        if tc.get("name"):
+                            if answering:
+                                print()
+                                answering = False
+                            print(f"  🔧 Using: {tc['name']}")
+                    
+                    content = chunk.content
+                    if content and isinstance(content, str):
+                        if not answering:
+                            sys.stdout.write("Ruty: ")
+                            answering = True
+                        sys.stdout.write(content)
+                        sys.stdout.flush()
+                
+                if answering:
+                    print()
                 
-                if final_response:
-                    print(f"Ruty: {final_response}")
+                turns += 1
+                if turns % HISTORY_FLUSH_TURNS == 0:
+                    values = agent.get_state(config).values
+                    pending = [m for m in values.get("messages", []) if m.id not in saved_ids]
+                    saved_ids.update(m.id for m in pending)
+                    part += 1
+                    thread = threading.Thread(
+                        target=save_session_history,
+                        args=(pending, session_id, part, False, values.get("memories_saved", False)),
+                        daemon=True,
+                    )
+                    thread.start()
+                    flush_threads.append(thread)
                 
             except Exception as e:
                 print(f"Error: {e}")
@@ -177,15 +270,33 @@ def interactive_chat():
         try:
             state = agent.get_state(config)
             if state and state.values and "messages" in state.values:
-                messages = state.values["messages"]
-                save_session_history(messages, session_id)
+                messages = [m for m in state.values["messages"] if m.id not in saved_ids]
+                # Turns trimmed from the agent state survive only in its summary
+                if state.values.get("summary"):
+                    messages.insert(0, AIMessage(
+                        content=f"[Summary of earlier conversation]\n{state.values['summary']}"
+                    ))
+                # Don't hold the prompt hostage to an LLM round-trip; the
+                # non-daemon thread still finishes before the interpreter exits
+                threading.Thread(
+                    target=_finish_session_save,
+                    args=(
+                        messages, session_id, part + 1 if part else None,
+                        flush_threads, state.values.get("memories_saved", False),
+                    ),
+                ).start()
         except Exception as e:
             print(f"Error saving history: {e}")
 
 
+def _env_persistent() -> bool:
+    """RUTY_PERSISTENT=0/false/no disables on-disk conversation checkpoints"""
+    return os.getenv("RUTY_PERSISTENT", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
 def main():
     """Entry point"""
-    interactive_chat()
+    interactive_chat(persistent=_env_persistent())
 
 
 if __name__ == "__main__":
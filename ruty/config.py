@@ -1,5 +1,13 @@
 from contextvars import ContextVar
+from functools import lru_cache
 
 # Context variable to store API keys for the current request
 # Keys: "groq", "supermemory"
 api_key_context: ContextVar[dict] = ContextVar("api_keys", default={})
+
+
+@lru_cache(maxsize=1)
+def ensure_env():
+    """Load .env into os.environ, once per process, on first use"""
+    from dotenv import load_dotenv
+    load_dotenv()
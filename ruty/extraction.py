@@ -1,8 +1,11 @@
 """Module for extracting semantic memories from conversation history"""
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-from langchain_openai import ChatOpenAI
 import os
 
+# Sessions smaller than this are skipped without calling the LLM
+MIN_EXCHANGES = 4
+MIN_CONVERSATION_CHARS = 500
+
 # Prompt for extracting memories
 EXTRACTION_PROMPT = """You are an expert memory assistant. Your goal is to extract valuable information from a conversation log.
 Analyze the following conversation and extract:
@@ -19,6 +22,56 @@ Conversation:
 {conversation}
 """
 
+# Prompt for folding older conversation turns into a running summary
+SUMMARY_PROMPT = """Summarize the conversation below so an assistant can continue it without the original messages.
+Keep user goals, facts, decisions, file paths, and open questions. Drop pleasantries and tool noise.
+Be concise: a short bulleted list.
+
+Existing summary (may be empty):
+{summary}
+
+New messages to fold in:
+{conversation}
+"""
+
+
+def summarize_conversation(messages, previous_summary, llm):
+    """
+    Fold messages into a running conversation summary.
+    
+    Args:
+        messages: LangChain messages that are leaving the context window
+        previous_summary: Summary of everything before them ("" if none)
+        llm: Chat model to use (the agent's current provider)
+        
+    Returns:
+        str: Updated summary, or None if summarization failed
+    """
+    lines = []
+    for msg in messages:
+        content = msg.content if isinstance(msg.content, str) else ""
+        if not content:
+            continue
+        if isinstance(msg, HumanMessage):
+            lines.append(f"User: {content}")
+        elif isinstance(msg, AIMessage):
+            lines.append(f"Assistant: {content}")
+        else:
+            lines.append(f"Tool: {content[:500]}")
+    
+    if not lines:
+        return previous_summary
+    
+    try:
+        prompt = SUMMARY_PROMPT.format(summary=previous_summary, conversation="\n".join(lines))
+        # "nostream" keeps this internal call out of LangGraph's token stream
+        response = llm.invoke([HumanMessage(content=prompt)], config={"tags": ["nostream"]})
+        return response.content.strip() or None
+    except Exception as e:
+        print(f"Error summarizing conversation: {e}")
+        return None
+
+
 def extract_semantic_memories(messages, model_name=None):
     """
     Extract meaningful insights from a conversation history suitable for long-term memory.
@@ -30,20 +83,19 @@ def extract_semantic_memories(messages, model_name=None):
     Returns:
         str: Extracted memories as text, or None if nothing to save
     """
-    # Filter for meaningful content
-    exchanges = [m for m in messages if isinstance(m, (HumanMessage, AIMessage))]
-    if len(exchanges) < 2:
+    # Format conversation for LLM (filter and format in one pass; messages
+    # without text, like bare tool calls, don't count as exchanges)
+    parts = [
+        f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
+        for msg in messages
+        if isinstance(msg, (HumanMessage, AIMessage)) and msg.content
+    ]
+    if len(parts) < MIN_EXCHANGES:
         return None
+    conversation_text = "\n".join(parts)
         
-    # Format conversation for LLM
-    conversation_text = ""
-    for msg in exchanges:
-        role = "User" if isinstance(msg, HumanMessage) else "Assistant"
-        content = msg.content
-        if not content: continue
-        conversation_text += f"{role}: {content}\n"
-        
-    if not conversation_text:
+    # Trivial sessions aren't worth an LLM round-trip
+    if len(conversation_text) < MIN_CONVERSATION_CHARS:
         return None
 
     # Default to the environment model
@@ -51,6 +103,7 @@ def extract_semantic_memories(messages, model_name=None):
         model_name = os.getenv("RUTY_MODEL", "moonshotai/kimi-k2-instruct-0905")
 
     # Use a separate LLM instance for extraction (can use a cheaper/faster model if desired)
+    from langchain_openai import ChatOpenAI
     llm = ChatOpenAI(
         model=model_name,
         api_key=os.getenv("GROQ_API_KEY"),
@@ -1,75 +1,158 @@
 """Qt5 Spotlight-style Window for Ruty"""
+import asyncio
+import html
+import threading
+
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QLineEdit, QLabel, QGraphicsDropShadowEffect
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve
-from PyQt5.QtGui import QFont, QPalette, QColor
-from langchain_core.messages import HumanMessage
+from PyQt5.QtGui import QFont, QPalette, QColor, QTextCursor
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from .memory import aclose_client
 
 
-class AgentWorker(QThread):
-    """Background thread for agent processing"""
-    response_ready = pyqtSignal(str)
+class AgentLoop(QThread):
+    """Background thread owning one asyncio event loop for all agent calls.
+    
+    Each query runs as a coroutine on that loop via agent.astream_events,
+    so tokens reach the UI as they are generated and no thread is spawned
+    per message. Call stop() at application exit.
     
-    def __init__(self, agent, config, user_input):
+    Tokens are buffered: tokens_ready fires only when the buffer goes from
+    empty to non-empty, and the GUI takes everything buffered by then with
+    take_tokens(), so a fast stream costs one GUI event per batch rather
+    than one per token.
+    
+    Every query gets an id from submit(); tool_started and response_ready
+    carry it so the GUI can drop results of a query it has moved on from,
+    and tokens from any query but the latest are discarded.
+    """
+    tokens_ready = pyqtSignal()
+    tool_started = pyqtSignal(int, str)
+    response_ready = pyqtSignal(int, str)
+    
+    def __init__(self, agent, config):
         super().__init__()
         self.agent = agent
         self.config = config
-        self.user_input = user_input
+        self.loop = asyncio.new_event_loop()
+        self._tokens = []
+        self._tokens_lock = threading.Lock()
+        self._query_id = 0  # Id of the latest submitted query
         
     def run(self):
-        """Process input with agent in background thread"""
+        """Run the event loop until stop() is called"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        
+    def stop(self):
+        """Stop the event loop and wait for the thread to exit"""
         try:
-            from langchain_core.messages import AIMessage, ToolMessage
-            
-            tool_names = []
-            ai_responses = []  # Collect all AI responses
+            asyncio.run_coroutine_threadsafe(aclose_client(), self.loop).result(timeout=5)
+        except Exception:
+            pass  # Shutting down anyway
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.wait()
+        
+    def _push_token(self, query_id, token):
+        """Buffer a token, signalling the GUI if the buffer was empty"""
+        with self._tokens_lock:
+            if query_id != self._query_id:
+                return  # A newer query has been submitted
+            first = not self._tokens
+            self._tokens.append(token)
+        if first:
+            self.tokens_ready.emit()
+        
+    def take_tokens(self):
+        """Return and clear all buffered tokens (called from the GUI thread)"""
+        with self._tokens_lock:
+            tokens, self._tokens = self._tokens, []
+        return "".join(tokens)
+        
+    def submit(self, user_input):
+        """Schedule a query on the loop; returns (query id, concurrent Future)"""
+        with self._tokens_lock:
+            self._query_id += 1
+            query_id = self._query_id
+            self._tokens = []  # Leftovers of an earlier query
+        future = asyncio.run_coroutine_threadsafe(self._process(query_id, user_input), self.loop)
+        return query_id, future
+        
+    async def _dangling_tool_results(self):
+        """ToolMessages answering tool calls a cancelled query left open.
+        
+        A query cancelled between the assistant and tools steps leaves an AI
+        message with tool calls in the checkpoint and no results for them,
+        which the provider rejects on the next call.
+        """
+        state = await self.agent.aget_state(self.config)
+        messages = state.values.get("messages", []) if state and state.values else []
+        answered = set()
+        for message in reversed(messages):
+            if isinstance(message, ToolMessage):
+                answered.add(message.tool_call_id)
+            elif isinstance(message, AIMessage):
+                return [
+                    ToolMessage(content="Cancelled", tool_call_id=call["id"])
+                    for call in message.tool_calls
+                    if call["id"] not in answered
+                ]
+        return []
+        
+    async def _process(self, query_id, user_input):
+        """Stream one query through the agent"""
+        try:
+            tool_names = {}  # Insertion-ordered set of tools used
+            final_response = ""
+            messages = await self._dangling_tool_results()
+            messages.append(HumanMessage(content=user_input))
             
-            # Stream events from agent
-            for event in self.agent.stream(
-                {"messages": [HumanMessage(content=self.user_input)]},
+            async for event in self.agent.astream_events(
+                {"messages": messages},
                 config=self.config,
-                stream_mode="values"
+                version="v2",
+                exclude_tags=["nostream"],
             ):
-                if "messages" in event:
-                    for msg in event["messages"]:
-                        # Track tool usage
-                        if hasattr(msg, "tool_calls") and msg.tool_calls:
-                            for tool_call in msg.tool_calls:
-                                tool_name = tool_call.get("name", "unknown")
-                                if tool_name not in tool_names:
-                                    tool_names.append(tool_name)
-                                    print(f"DEBUG: Tool called: {tool_name}")
-                        
-                        # Capture AI responses (final answers, not tool call requests)
-                        if isinstance(msg, AIMessage):
-                            # Only capture if it has content and is NOT followed by tool calls
-                            if msg.content and not (hasattr(msg, "tool_calls") and msg.tool_calls):
-                                print(f"DEBUG: AI Response captured: {msg.content[:100]}...")
-                                ai_responses.append(msg.content)
+                kind = event["event"]
+                
+                # Track tool usage
+                if kind == "on_tool_start":
+                    tool_names[event["name"]] = None
+                    self.tool_started.emit(query_id, event["name"])
+                    continue
+                
+                if event.get("metadata", {}).get("langgraph_node") != "assistant":
+                    continue
+                
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if isinstance(content, str) and content:
+                        self._push_token(query_id, content)
+                elif kind == "on_chat_model_end":
+                    # Final answers are AI messages without tool calls
+                    output = event["data"]["output"]
+                    if output.content and not output.tool_calls:
+                        final_response = output.content
             
-            print(f"DEBUG: Total AI responses: {len(ai_responses)}")
-            print(f"DEBUG: Tools used: {tool_names}")
-            
-            # Format output - use the LAST AI response (most final)
+            # Format output
             output_parts = []
             if tool_names:
                 output_parts.append(f"<i>🔧 {', '.join(tool_names)}</i>")
             
-            if ai_responses:
-                # Use last AI response (the final answer)
-                output_parts.append(ai_responses[-1])
+            if final_response:
+                output_parts.append(final_response)
             
             full_response = "<br><br>".join(output_parts) if output_parts else "No response"
-            print(f"DEBUG: Final response length: {len(full_response)}")
-            self.response_ready.emit(full_response)
+            self.response_ready.emit(query_id, full_response)
             
         except Exception as e:
             import traceback
-            print(f"DEBUG: Exception: {e}")
             traceback.print_exc()
             error_msg = f"<b>❌ Error:</b> {str(e)}<br><small><pre>{traceback.format_exc()}</pre></small>"
-            self.response_ready.emit(error_msg)
+            self.response_ready.emit(query_id, error_msg)
 
 
 class RutyChatWindow(QWidget):
@@ -79,7 +162,19 @@ class RutyChatWindow(QWidget):
         super().__init__()
         self.agent = agent
         self.config = config
-        self.worker = None
+        self.streaming = False  # True once the first token of a reply arrived
+        self.pending = None  # Future of the query currently running
+        self.query_id = 0  # Id of that query; results of older ones are dropped
+        self._last_height = 200  # Height the window was last resized to
+        
+        # One background event loop serves every query from this window.
+        # Its signals are emitted from the loop's thread, so they are always
+        # queued onto the GUI thread
+        self.agent_loop = AgentLoop(agent, config)
+        self.agent_loop.tokens_ready.connect(self.on_tokens, Qt.QueuedConnection)
+        self.agent_loop.tool_started.connect(self.on_tool_started, Qt.QueuedConnection)
+        self.agent_loop.response_ready.connect(self.on_response_ready, Qt.QueuedConnection)
+        self.agent_loop.start()
         
         # Window properties - Spotlight style
         self.setWindowTitle("Ruty")
@@ -159,6 +254,8 @@ class RutyChatWindow(QWidget):
                 padding: 8px;
             }
         """)
+        # Parsed once here instead of wrapping every response in a styled div
+        self.result_area.document().setDefaultStyleSheet("body { line-height: 1.6; }")
         self.result_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.result_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         layout.addWidget(self.result_area, 1)
@@ -178,18 +275,44 @@ class RutyChatWindow(QWidget):
         # Disable input while processing
         self.input_field.setEnabled(False)
         
-        # Process in background thread
-        self.worker = AgentWorker(self.agent, self.config, user_input)
-        self.worker.response_ready.connect(self.on_response_ready)
-        self.worker.start()
+        # Process on the background event loop, superseding any query still
+        # running (e.g. one left going when the window was hidden)
+        self.cancel_pending()
+        self.streaming = False
+        self.query_id, self.pending = self.agent_loop.submit(user_input)
+        
+    def cancel_pending(self):
+        """Cancel the running query, if any, so it stops generating"""
+        if self.pending is not None and not self.pending.done():
+            self.pending.cancel()  # Cancels the task on the agent loop
+        self.pending = None
         
-    def on_response_ready(self, response):
+    def on_tool_started(self, query_id, name):
+        """Show which tool is running until the answer starts streaming"""
+        if query_id == self.query_id and not self.streaming:
+            self.result_area.setHtml(f"🔧 <i>{html.escape(name)}...</i>")
+        
+    def on_tokens(self):
+        """Append the streamed tokens buffered so far to the result area"""
+        token = self.agent_loop.take_tokens()
+        if not token:
+            return
+        if not self.streaming:
+            # First token replaces the thinking indicator
+            self.result_area.clear()
+            self.streaming = True
+        self.result_area.moveCursor(QTextCursor.End)
+        self.result_area.insertPlainText(token)
+        
+    def on_response_ready(self, query_id, response):
         """Handle agent response"""
-        # Clear thinking message
-        self.result_area.clear()
+        if query_id != self.query_id:
+            return  # Superseded by a newer query
+        self.pending = None
+        self.streaming = False
         
-        # Show response with proper formatting
-        self.result_area.setHtml(f"<div style='line-height: 1.6;'>{response}</div>")
+        # Replace the streamed text with the formatted response
+        self.result_area.setHtml(response)
         
         # Force document layout update
         self.result_area.document().setTextWidth(self.result_area.viewport().width())
@@ -201,8 +324,11 @@ class RutyChatWindow(QWidget):
         needed_height = min(int(doc_height) + input_height + padding, 500)  # Cap at 500px
         needed_height = max(needed_height, 200)  # Min 200px
         
-        self.resize(600, needed_height)
-        self.center_on_screen()
+        # Resize only on a real change; the top edge stays where it was
+        # placed on show, so there is no need to recenter
+        if abs(needed_height - self._last_height) >= 40:
+            self.resize(600, needed_height)
+            self._last_height = needed_height
         
         # Clear input and re-enable
         self.input_field.clear()
@@ -221,8 +347,11 @@ class RutyChatWindow(QWidget):
     def keyPressEvent(self, event):
         """Handle keyboard shortcuts"""
         if event.key() == Qt.Key_Escape:
-            # Reset size and hide
+            # Reset size and hide; a reply still being generated keeps
+            # running and shows up when the window is opened again
+            self.input_field.setEnabled(True)
             self.resize(600, 200)
+            self._last_height = 200
             self.result_area.clear()
             self.hide()
         else:
@@ -243,8 +372,10 @@ class RutyChatWindow(QWidget):
     def toggle_visibility(self):
         """Show or hide the window"""
         if self.isVisible():
-            # Reset to default size when hiding
+            # Reset to default size when hiding; see keyPressEvent
+            self.input_field.setEnabled(True)
             self.resize(600, 200)
+            self._last_height = 200
             self.result_area.clear()
             self.hide()
         else:
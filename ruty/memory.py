@@ -1,134 +1,611 @@
 """Supermemory client wrapper for memory operations"""
 import os
-import requests
+import gzip
+import asyncio
+import json
+import atexit
+import logging
+import hashlib
+import mmap
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import islice
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Ensure .env is loaded before accessing environment variables
-load_dotenv()
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:  # Fall back to the stdlib if orjson isn't installed
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+    _json_loads = json.loads
 
-from .config import api_key_context
+from .config import api_key_context, ensure_env
+
+logger = logging.getLogger(__name__)
 
 def get_supermemory_key():
-    return api_key_context.get().get("supermemory") or os.getenv("SUPERMEMORY_API_KEY")
+    key = api_key_context.get().get("supermemory")
+    if key:
+        return key
+    # Ensure .env is loaded before accessing environment variables
+    ensure_env()
+    return os.getenv("SUPERMEMORY_API_KEY")
 
-TEXT_EXTENSIONS = {'.txt', '.md', '.py', '.json', '.csv', '.html', '.css', '.js'}
-BINARY_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg', '.gif', '.webp'}
+TEXT_EXTENSIONS = frozenset({'.txt', '.md', '.py', '.json', '.csv', '.html', '.css', '.js'})
+BINARY_EXTENSIONS = frozenset({'.pdf', '.png', '.jpg', '.jpeg', '.gif', '.webp'})
 SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | BINARY_EXTENSIONS
 
+# Max concurrent uploads when syncing a directory (kept below the pool size)
+SYNC_WORKERS = 16
 
-def get_headers():
-    """Get common headers for Supermemory API"""
+# Text files above this size are streamed as multipart uploads instead of
+# being decoded into one big JSON string
+LARGE_TEXT_BYTES = 1024 * 1024
+
+# Local cache of file digests: abs_path -> [mtime_ns, size, digest, uploaded]
+# where uploaded is the digest last synced to Supermemory (if any)
+SYNC_CACHE_FILE = Path.home() / ".config" / "ruty" / "sync_cache.json"
+
+# customIds already on Supermemory, reused across syncs for EXISTING_IDS_TTL
+# seconds: {"key": <api key fingerprint>, "updated_at": ..., "ids": [...]}
+EXISTING_IDS_FILE = Path.home() / ".config" / "ruty" / "existing_ids.json"
+EXISTING_IDS_TTL = 300
+
+@lru_cache(maxsize=1)
+def _session():
+    """Shared HTTP session so every Supermemory call reuses pooled keep-alive
+    connections instead of paying a fresh TCP + TLS handshake per request.
+    
+    Built on first use, so importing this module doesn't pull in requests.
+    Auth headers stay per-call since the key can change per request (BYOK).
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,  # Only one host is ever contacted
+        pool_maxsize=32,  # Directory sync + page fetches + prefetch at once
+        max_retries=Retry(
+            total=3,
+            read=0,  # Never replay a request the server may already have applied
+            backoff_factor=0.2,
+            # Only statuses where the server did not act on the request, so
+            # replaying a POST can't create a duplicate memory
+            status_forcelist=[429, 503],
+            allowed_methods=None,  # The Supermemory API is mostly POST
+            # Hand back the last response once retries run out, so callers
+            # checking response.ok see the failure instead of a RetryError
+            raise_on_status=False,
+        ),
+    ))
+    atexit.register(session.close)
+    return session
+
+
+@lru_cache(maxsize=16)
+def _headers_for_key(api_key: str) -> dict:
+    """Build (once per key) the common headers for Supermemory API"""
     return {
-        "Authorization": f"Bearer {get_supermemory_key()}",
+        "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
 
 
-def list_memories():
-    """Get all existing memories from Supermemory"""
-    all_memories = []
-    page = 1
+def _auth_headers():
+    """Authorization-only headers, for requests without a JSON body"""
+    return {"Authorization": f"Bearer {get_supermemory_key()}"}
+
+
+def get_headers():
+    """Get common headers for Supermemory API (shared dict, do not mutate)"""
+    return _headers_for_key(get_supermemory_key())
+
+
+# JSON bodies at least this large are gzip-compressed, unless the server has
+# already rejected a compressed body in this process
+COMPRESS_MIN_BYTES = 64 * 1024
+_compression_supported = True
+
+
+def _post_json(url: str, payload: dict, compress: bool = False):
+    """POST a JSON payload to Supermemory on the shared session"""
+    global _compression_supported
+    body = _json_dumps(payload)
     
-    while True:
-        response = requests.post(
-            "https://api.supermemory.ai/v3/documents/list",
-            headers=get_headers(),
-            json={"limit": 200, "page": page}
+    if compress and _compression_supported and len(body) >= COMPRESS_MIN_BYTES:
+        response = _session().post(
+            url,
+            headers={**get_headers(), "Content-Encoding": "gzip"},
+            data=gzip.compress(body, compresslevel=6)
         )
-        if not response.ok:
-            break
-        
-        data = response.json()
-        # API returns 'memories' not 'documents'
-        memories = data.get("memories", [])
-        if not memories:
-            break
-        
-        all_memories.extend(memories)
-        page += 1
+        if not _rejected_encoding(response):
+            return response
+        # The server may not understand compressed bodies: retry plain, and
+        # only stop compressing if the plain body is then accepted
+        response = _session().post(url, headers=get_headers(), data=body)
+        if response.ok:
+            _compression_supported = False
+        return response
+    
+    return _session().post(url, headers=get_headers(), data=body)
+
+
+def _rejected_encoding(response) -> bool:
+    """Whether a response rejects the request's Content-Encoding.
+    
+    A 400 only counts if it mentions the encoding; any other 400 is a real
+    validation error that a plain resend would hit too.
+    """
+    if response.status_code == 415:
+        return True
+    if response.status_code == 400:
+        body = response.text.lower()
+        return "encoding" in body or "gzip" in body
+    return False
+
+
+def _response_json(response):
+    """Decode a Supermemory response body"""
+    return _json_loads(response.content)
+
+
+MEMORY_PAGE_SIZE = 200
+MEMORY_PAGE_WORKERS = 8
+
+
+def _fetch_memory_page(page: int) -> tuple:
+    """Fetch one page of memories.
+    
+    Returns:
+        (memories, total_pages); memories is empty on error/end and
+        total_pages is None when the response has no pagination info
+    """
+    response = _post_json(
+        "https://api.supermemory.ai/v3/documents/list",
+        {"limit": MEMORY_PAGE_SIZE, "page": page}
+    )
+    if not response.ok:
+        return [], None
+    
+    data = _response_json(response)
+    # API returns 'memories' not 'documents'
+    return data.get("memories", []), (data.get("pagination") or {}).get("totalPages")
+
+
+def _fetch_memories_only(page: int) -> list:
+    """Memories of one page, without the pagination info"""
+    return _fetch_memory_page(page)[0]
+
+
+def iter_memories():
+    """Lazily yield memories page by page from Supermemory.
     
-    return all_memories
+    Page 1 reports the page count, so the remaining pages are fetched
+    concurrently and yielded in order. Without pagination info, pages are
+    walked one by one with the next page prefetched in the background.
+    """
+    memories, total_pages = _fetch_memory_page(1)
+    if not memories:
+        return
+    yield from memories
+    
+    if total_pages is not None:
+        if total_pages > 1:
+            # A context can only be entered by one thread at a time, so
+            # each page runs in its own copy of the caller's context
+            ctx = contextvars.copy_context()
+            with ThreadPoolExecutor(max_workers=MEMORY_PAGE_WORKERS) as executor:
+                pages = executor.map(
+                    lambda page: ctx.copy().run(_fetch_memories_only, page),
+                    range(2, total_pages + 1),
+                )
+                for memories in pages:
+                    yield from memories
+        return
+    
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        page = 2
+        pending = prefetcher.submit(contextvars.copy_context().run, _fetch_memories_only, page)
+        while True:
+            memories = pending.result()
+            if not memories:
+                return
+            
+            page += 1
+            pending = prefetcher.submit(contextvars.copy_context().run, _fetch_memories_only, page)
+            yield from memories
+
+
+def list_memories():
+    """Get all existing memories from Supermemory"""
+    return list(iter_memories())
 
 
-def list_docs():
-    """List all documents from Supermemory"""
-    response = requests.post(
+def list_docs(limit: int = 200):
+    """List the first limit documents from Supermemory"""
+    response = _post_json(
         "https://api.supermemory.ai/v3/documents/list",
-        headers=get_headers(),
-        json={"limit": 200, "page": 1}
+        {"limit": limit, "page": 1}
     )
     if not response.ok:
         return None
-    return response.json()
+    return _response_json(response)
 
 
 def delete_document(doc_id: str):
     """Delete a document from Supermemory"""
-    response = requests.delete(
+    response = _session().delete(
         f"https://api.supermemory.ai/v3/documents/{doc_id}",
-        headers={"Authorization": f"Bearer {SUPERMEMORY_API_KEY}"}
+        headers=_auth_headers()
     )
     if not response.ok:
         return None
-    return response.json()
+    _invalidate_search_cache()
+    _invalidate_existing_ids()
+    return _response_json(response)
 
 
-def add_memory_to_supermemory(content: str, custom_id: str = None, title: str = None):
-    """Add a memory to Supermemory"""
+def _memory_payload(content: str, custom_id: str = None, title: str = None) -> dict:
     payload = {"content": content}
     if custom_id:
         payload["customId"] = custom_id
     if title:
         payload["title"] = title
-    
-    response = requests.post(
+    return payload
+
+
+def add_memory_to_supermemory(content: str, custom_id: str = None, title: str = None):
+    """Add a memory to Supermemory"""
+    response = _post_json(
         "https://api.supermemory.ai/v3/memories",
-        headers=get_headers(),
-        json=payload
+        _memory_payload(content, custom_id, title),
+        compress=True
     )
     if not response.ok:
         return None
-    return response.json()
+    _invalidate_search_cache()
+    return _response_json(response)
 
 
 def upload_file_to_supermemory(file_path: Path, custom_id: str = None):
-    """Upload a file directly to Supermemory"""
+    """Upload a file directly to Supermemory
+    
+    With requests_toolbelt installed the multipart body is streamed from disk
+    instead of being assembled in memory first.
+    """
+    headers = _auth_headers()
+    try:
+        from requests_toolbelt.multipart.encoder import MultipartEncoder
+    except ImportError:  # Uploads fall back to requests' in-memory multipart
+        MultipartEncoder = None
+    
     with open(file_path, 'rb') as f:
-        files = {'file': (file_path.name, f)}
         data = {}
         if custom_id:
             data['customId'] = custom_id
         
-        response = requests.post(
-            "https://api.supermemory.ai/v3/documents/file",
-            headers={"Authorization": f"Bearer {SUPERMEMORY_API_KEY}"},
-            files=files,
-            data=data
-        )
+        if MultipartEncoder is not None:
+            encoder = MultipartEncoder(fields={
+                **data,
+                'file': (file_path.name, f, 'application/octet-stream'),
+            })
+            response = _session().post(
+                "https://api.supermemory.ai/v3/documents/file",
+                headers={**headers, "Content-Type": encoder.content_type},
+                data=encoder
+            )
+        else:
+            response = _session().post(
+                "https://api.supermemory.ai/v3/documents/file",
+                headers=headers,
+                files={'file': (file_path.name, f)},
+                data=data
+            )
     if not response.ok:
         return None
-    return response.json()
+    _invalidate_search_cache()
+    return _response_json(response)
+
+
+# Exact-match cache for search results: (key, normalized query, limit) ->
+# (timestamp, results). Entries expire after SEARCH_CACHE_TTL seconds and the
+# whole cache is dropped whenever this process writes to Supermemory.
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 120
+_search_cache: OrderedDict = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+
+def _invalidate_search_cache():
+    """Forget cached search results after the knowledge base changes"""
+    with _search_cache_lock:
+        _search_cache.clear()
+
+
+def _search_cache_key(query: str, limit: int) -> tuple:
+    """Cache key for a search; includes the API key so BYOK users never
+    see each other's results"""
+    return get_supermemory_key(), " ".join(query.lower().split()), limit
+
+
+def _search_cache_get(cache_key: tuple, now: float):
+    """Cached results for cache_key, or None if missing/expired"""
+    with _search_cache_lock:
+        hit = _search_cache.get(cache_key)
+        if hit and now - hit[0] < SEARCH_CACHE_TTL:
+            _search_cache.move_to_end(cache_key)
+            return hit[1]
+    return None
+
+
+def _search_cache_put(cache_key: tuple, now: float, results: list):
+    with _search_cache_lock:
+        _search_cache[cache_key] = (now, results)
+        _search_cache.move_to_end(cache_key)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+
+
+def _search_payload(query: str, limit: int) -> dict:
+    return {
+        "q": query, 
+        "limit": limit,
+        "searchMode": "hybrid"  # Search both memories and chunks
+    }
 
 
 def search_supermemory(query: str, limit: int = 5):
     """Search for relevant context in Supermemory using v4 hybrid mode.
     
     Searches both memories and document chunks for best results.
+    Repeated queries are served from a small in-process cache.
     """
-    response = requests.post(
+    cache_key = _search_cache_key(query, limit)
+    now = time.monotonic()
+    results = _search_cache_get(cache_key, now)
+    if results is not None:
+        return results
+    
+    response = _post_json(
         "https://api.supermemory.ai/v4/search",  # v4 endpoint
-        headers=get_headers(),
-        json={
-            "q": query, 
-            "limit": limit,
-            "searchMode": "hybrid"  # Search both memories and chunks
-        }
+        _search_payload(query, limit)
     )
     if not response.ok:
         return []
-    data = response.json()
-    return data.get("results", [])
+    results = _response_json(response).get("results", [])
+    _search_cache_put(cache_key, now, results)
+    return results
+
+
+# ============== Async API ==============
+# Coroutine versions of the hot Supermemory calls, for callers running on an
+# event loop (the GUI's agent loop, FastAPI). They share the search cache with
+# the sync functions above. httpx clients are bound to the loop they were
+# first used on, so one pooled client is kept per running loop.
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _async_client():
+    """Pooled httpx.AsyncClient for the running event loop"""
+    import httpx
+    
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(30, connect=10),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60),
+            transport=httpx.AsyncHTTPTransport(retries=2),  # Connection failures only
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_client():
+    """Close the running loop's client; call before the loop shuts down"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _apost_json(url: str, payload: dict):
+    """POST a JSON payload to Supermemory on the loop's shared client"""
+    return await _async_client().post(url, headers=get_headers(), content=_json_dumps(payload))
+
+
+async def asearch_supermemory(query: str, limit: int = 5):
+    """Async search_supermemory"""
+    cache_key = _search_cache_key(query, limit)
+    now = time.monotonic()
+    results = _search_cache_get(cache_key, now)
+    if results is not None:
+        return results
+    
+    response = await _apost_json(
+        "https://api.supermemory.ai/v4/search",
+        _search_payload(query, limit)
+    )
+    if not response.is_success:
+        return []
+    results = _json_loads(response.content).get("results", [])
+    _search_cache_put(cache_key, now, results)
+    return results
+
+
+async def alist_memories():
+    """Async list_memories; pages after the first are fetched concurrently"""
+    async def fetch(page):
+        response = await _apost_json(
+            "https://api.supermemory.ai/v3/documents/list",
+            {"limit": MEMORY_PAGE_SIZE, "page": page}
+        )
+        if not response.is_success:
+            return {}
+        return _json_loads(response.content)
+    
+    first = await fetch(1)
+    memories = first.get("memories", [])
+    total_pages = (first.get("pagination") or {}).get("totalPages")
+    if not memories:
+        return []
+    
+    if total_pages is not None:
+        pages = await asyncio.gather(*(fetch(page) for page in range(2, total_pages + 1)))
+        for data in pages:
+            memories.extend(data.get("memories", []))
+        return memories
+    
+    page = 2
+    while True:
+        batch = (await fetch(page)).get("memories", [])
+        if not batch:
+            return memories
+        memories.extend(batch)
+        page += 1
+
+
+async def aadd_memory_to_supermemory(content: str, custom_id: str = None, title: str = None):
+    """Async add_memory_to_supermemory"""
+    response = await _apost_json(
+        "https://api.supermemory.ai/v3/memories",
+        _memory_payload(content, custom_id, title)
+    )
+    if not response.is_success:
+        return None
+    _invalidate_search_cache()
+    return _json_loads(response.content)
+
+
+# Directories never worth walking into: VCS metadata, caches, dependencies
+SKIP_DIRS = frozenset({'.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv', '.mypy_cache', '.pytest_cache'})
+
+
+def _iter_files(root: Path, extensions, recursive: bool = True):
+    """Yield files under root whose suffix is in extensions.
+    
+    Uses os.scandir so file types come from the directory entry cache and
+    non-matching names are dropped before any stat call. Symlinks are not
+    followed, and SKIP_DIRS are not descended into.
+    """
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    # Directories first, so one named like a file
+                    # ("notes.md/") is still descended into
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and entry.name not in SKIP_DIRS:
+                            stack.append(entry.path)
+                    elif (
+                        entry.is_file(follow_symlinks=False)
+                        and os.path.splitext(entry.name)[1].lower() in extensions
+                    ):
+                        yield Path(entry.path)
+        except OSError:
+            continue
+
+
+def _load_sync_cache() -> dict:
+    """Load the digest cache used to skip re-hashing unchanged files"""
+    try:
+        with open(SYNC_CACHE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_sync_cache(cache: dict):
+    """Persist the digest cache (best effort)"""
+    try:
+        SYNC_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(SYNC_CACHE_FILE, "w") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+
+def _key_fingerprint() -> str:
+    """Short hash of the Supermemory key, so cached IDs never cross accounts"""
+    return hashlib.sha256((get_supermemory_key() or "").encode()).hexdigest()[:16]
+
+
+def _load_existing_ids() -> tuple:
+    """customIds already uploaded, from the local cache while it is fresh.
+    
+    Returns:
+        (ids, updated_at) where updated_at is when the IDs were listed
+    """
+    try:
+        with open(EXISTING_IDS_FILE, "r") as f:
+            data = json.load(f)
+        if data.get("key") == _key_fingerprint() and time.time() - data["updated_at"] < EXISTING_IDS_TTL:
+            return set(data["ids"]), data["updated_at"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    # Collect existing IDs page by page without materializing every memory
+    updated_at = time.time()
+    return {m["customId"] for m in iter_memories() if m.get("customId")}, updated_at
+
+
+def _save_existing_ids(ids: set, updated_at: float):
+    """Persist the ID cache (best effort); updated_at is kept from the listing
+    so the cache still expires even if syncs keep adding to it"""
+    try:
+        EXISTING_IDS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(EXISTING_IDS_FILE, "w") as f:
+            json.dump({"key": _key_fingerprint(), "updated_at": updated_at, "ids": list(ids)}, f)
+    except OSError:
+        pass
+
+
+def _invalidate_existing_ids():
+    """Drop the ID cache after a delete so the next sync re-lists"""
+    try:
+        EXISTING_IDS_FILE.unlink()
+    except OSError:
+        pass
+
+
+def _file_digest(file_path: Path, cache: dict) -> str:
+    """SHA-256 of a file, reusing the cached digest if mtime and size match"""
+    st = file_path.stat()
+    key = str(file_path)
+    cached = cache.get(key)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        if len(cached) < 4:
+            cached.append(None)  # Entry written before uploads were tracked
+        return cached[2]
+    
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    # Keep the last uploaded digest; it is what tells an edit apart
+    uploaded = cached[3] if cached and len(cached) > 3 else None
+    cache[key] = [st.st_mtime_ns, st.st_size, digest, uploaded]
+    return digest
+
+
+def _upload_one(file_path: Path, custom_id: str, title: str):
+    """Upload a single synced file, picking multipart vs JSON by extension"""
+    if file_path.suffix.lower() in BINARY_EXTENSIONS or file_path.stat().st_size > LARGE_TEXT_BYTES:
+        return upload_file_to_supermemory(file_path, custom_id=custom_id)
+    content = file_path.read_text(encoding="utf-8")
+    return add_memory_to_supermemory(content, custom_id=custom_id, title=title)
 
 
 def sync_directory_to_supermemory(directory: Path, recursive: bool = True):
@@ -136,42 +613,90 @@ def sync_directory_to_supermemory(directory: Path, recursive: bool = True):
     if not directory.exists() or not directory.is_dir():
         return {"error": f"Invalid directory: {directory}", "synced": 0, "skipped": 0}
     
-    # Get existing memories
-    existing_memories = list_memories()
-    existing_ids = {m.get("customId") for m in existing_memories if m.get("customId")}
+    existing_ids, ids_updated_at = _load_existing_ids()
     
     files_synced = 0
     files_skipped = 0
+    files_failed = 0
     
-    pattern = "**/*" if recursive else "*"
+    digest_cache = _load_sync_cache()
     
-    for file_path in directory.glob(pattern):
-        if not file_path.is_file():
-            continue
-        
-        if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
-            continue
-        
-        rel_path = file_path.relative_to(directory)
-        custom_id = f"dir:{directory.name}/{rel_path}"
-        
-        if custom_id in existing_ids:
-            files_skipped += 1
-            continue
-        
-        try:
-            if file_path.suffix.lower() in BINARY_EXTENSIONS:
-                result = upload_file_to_supermemory(file_path, custom_id=custom_id)
-            else:
-                content = file_path.read_text(encoding="utf-8")
-                result = add_memory_to_supermemory(content, custom_id=custom_id, title=str(rel_path))
+    # Uploads are I/O bound, so fan them out over a small pool sharing _session().
+    # Each task runs in a copy of the caller's context so api_key_context
+    # (per-request BYOK keys) is visible inside the worker threads.
+    with ThreadPoolExecutor(max_workers=SYNC_WORKERS) as executor:
+        futures = {}  # future -> (custom_id, cache entry, digest)
+        for file_path in _iter_files(directory, SUPPORTED_EXTENSIONS, recursive):
+            rel_path = file_path.relative_to(directory)
+            custom_id = f"dir:{directory.name}/{rel_path}"
+            # The customId stays the same across edits (re-uploading it
+            # updates the document); the locally cached digest of the last
+            # upload tells unchanged files apart without any network call
+            try:
+                digest = _file_digest(file_path, digest_cache)
+            except OSError:
+                continue
+            entry = digest_cache[str(file_path)]
+            
+            if custom_id in existing_ids:
+                if entry[3] is None:
+                    entry[3] = digest  # Synced before digests were tracked
+                if entry[3] == digest:
+                    files_skipped += 1
+                    continue
             
-            if result:
+            future = executor.submit(
+                contextvars.copy_context().run,
+                _upload_one, file_path, custom_id, str(rel_path),
+            )
+            futures[future] = (custom_id, entry, digest)
+        
+        for future in as_completed(futures):
+            try:
+                ok = future.result()
+            except Exception as e:
+                # Report rather than hide, so a broken upload path shows up
+                logger.warning("skip %s: %s", futures[future][0], e)
+                ok = False
+            if ok:
+                custom_id, entry, digest = futures[future]
                 files_synced += 1
-        except Exception:
-            pass
+                existing_ids.add(custom_id)
+                entry[3] = digest
+            else:
+                files_failed += 1
     
-    return {"synced": files_synced, "skipped": files_skipped}
+    _save_sync_cache(digest_cache)
+    _save_existing_ids(existing_ids, ids_updated_at)
+    return {"synced": files_synced, "skipped": files_skipped, "failed": files_failed}
+
+
+def _read_head(file_path: Path, size: int = 2000):
+    """Read the first size characters of a text file, or None on error"""
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read(size)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=32)
+def _file_context(path_str: str, mtime_ns: int, size: int, limit: int) -> str:
+    """Formatted head of a file; cache key includes mtime/size so edits miss"""
+    path = Path(path_str)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read(limit)
+    return f"### {path.name}\n```\n{content}\n```"
+
+
+def read_file_context(file_path: Path, limit: int = 5000) -> str:
+    """Read the first limit characters of a file as a context block.
+    
+    Only the prefix is read from disk, and reloading an unchanged file
+    costs a single stat() call.
+    """
+    st = file_path.stat()
+    return _file_context(str(file_path), st.st_mtime_ns, st.st_size, limit)
 
 
 def read_directory_context(directory: Path, max_files: int = 20) -> str:
@@ -179,24 +704,68 @@ def read_directory_context(directory: Path, max_files: int = 20) -> str:
     if not directory.exists():
         return f"Directory not found: {directory}"
     
-    context_parts = []
-    file_count = 0
+    # Take one extra candidate to know whether the limit truncated anything
+    candidates = list(islice(_iter_files(directory, TEXT_EXTENSIONS), max_files + 1))
+    truncated = len(candidates) > max_files
+    candidates = candidates[:max_files]
     
-    for file_path in directory.rglob("*"):
-        if not file_path.is_file():
-            continue
-        if file_path.suffix.lower() not in TEXT_EXTENSIONS:
-            continue
-        if file_count >= max_files:
-            context_parts.append(f"\n... (truncated, {max_files} files limit)")
-            break
-        
-        try:
-            content = file_path.read_text(encoding="utf-8")
-            rel_path = file_path.relative_to(directory)
-            context_parts.append(f"### {rel_path}\n```\n{content[:2000]}\n```")
-            file_count += 1
-        except Exception:
+    # Only the head of each file is used; read them concurrently, in order
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        contents = list(executor.map(_read_head, candidates))
+    
+    context_parts = []
+    for file_path, content in zip(candidates, contents):
+        if content is None:
             continue
+        rel_path = file_path.relative_to(directory)
+        context_parts.append(f"### {rel_path}\n```\n{content}\n```")
+    
+    if truncated:
+        context_parts.append(f"\n... (truncated, {max_files} files limit)")
     
     return "\n\n".join(context_parts) if context_parts else "No readable files found."
+
+
+# Lazy directory context: index file names up front, read slices on demand
+CONTEXT_INDEX_MAX_BYTES = 10 * 1024 * 1024
+CONTEXT_INDEX_MAX_FILES = 500
+
+
+def build_context_index(directory: Path, max_files: int = CONTEXT_INDEX_MAX_FILES) -> dict:
+    """Map relative paths of text files under directory to absolute paths.
+    
+    Only the directory listing and one stat per file are touched; contents
+    are read later, slice by slice, via read_context_slice.
+    """
+    index = {}
+    for file_path in _iter_files(directory, TEXT_EXTENSIONS):
+        try:
+            if file_path.stat().st_size >= CONTEXT_INDEX_MAX_BYTES:
+                continue
+        except OSError:
+            continue
+        index[file_path.relative_to(directory).as_posix()] = str(file_path)
+        if len(index) >= max_files:
+            break
+    return index
+
+
+def format_context_index(directory: Path, index: dict) -> str:
+    """File listing shown to the model in place of the file contents"""
+    if not index:
+        return "No readable files found."
+    lines = [f"Files in {directory} (read them with read_context_file):"]
+    lines.extend(f"- {name}" for name in index)
+    if len(index) >= CONTEXT_INDEX_MAX_FILES:
+        lines.append(f"... (truncated, {CONTEXT_INDEX_MAX_FILES} files limit)")
+    return "\n".join(lines)
+
+
+def read_context_slice(file_path: str, offset: int = 0, length: int = 4096) -> str:
+    """Read length bytes at offset from a file without loading the rest"""
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if offset >= size:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[offset:offset + length].decode("utf-8", errors="replace")
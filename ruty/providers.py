@@ -5,10 +5,16 @@ Currently supports: Groq, OpenAI, Ollama (local)
 """
 import os
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Optional
 from pathlib import Path
 import json
 
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib if orjson isn't installed
+    orjson = None
+
 
 @dataclass
 class ProviderConfig:
@@ -19,6 +25,7 @@ class ProviderConfig:
     api_key_env: str  # Environment variable name for API key
     models: list[str] = field(default_factory=list)
     requires_key: bool = True
+    light_model: Optional[str] = None  # Smaller model for trivial turns
 
 
 # Supported providers
@@ -28,6 +35,7 @@ PROVIDERS = {
         base_url="https://api.groq.com/openai/v1",
         default_model="moonshotai/kimi-k2-instruct",
         api_key_env="GROQ_API_KEY",
+        light_model="llama-3.1-8b-instant",
         models=[
             "moonshotai/kimi-k2-instruct",
             "llama-3.3-70b-versatile",
@@ -67,6 +75,7 @@ PROVIDERS = {
         base_url="https://openrouter.ai/api/v1",
         default_model="anthropic/claude-3.5-sonnet",
         api_key_env="OPENROUTER_API_KEY",
+        light_model="anthropic/claude-3-haiku",
         models=[
             "anthropic/claude-3.5-sonnet",
             "anthropic/claude-3-haiku",
@@ -89,12 +98,23 @@ class RutyConfig:
     theme: str = "dark"
     hotkey: str = "Super+Space"
     
-    @property
+    # Derived values cached in __dict__ and dropped when their inputs change
+    _DERIVED = {
+        "provider": ("current_provider", "current_model"),
+        "model": ("current_model",),
+    }
+    
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        for cached in self._DERIVED.get(name, ()):
+            self.__dict__.pop(cached, None)
+    
+    @cached_property
     def current_provider(self) -> ProviderConfig:
         """Get the current provider config."""
         return PROVIDERS.get(self.provider, PROVIDERS["groq"])
     
-    @property
+    @cached_property
     def current_model(self) -> str:
         """Get the current model name."""
         return self.model or self.current_provider.default_model
@@ -128,8 +148,8 @@ def load_config() -> RutyConfig:
     """Load configuration from file or return defaults."""
     if CONFIG_FILE.exists():
         try:
-            with open(CONFIG_FILE, "r") as f:
-                data = json.load(f)
+            raw = CONFIG_FILE.read_bytes()
+            data = orjson.loads(raw) if orjson else json.loads(raw)
             return RutyConfig(**data)
         except Exception as e:
             print(f"⚠️ Failed to load config: {e}")
@@ -139,15 +159,18 @@ def load_config() -> RutyConfig:
 def save_config(config: RutyConfig):
     """Save configuration to file."""
     CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-    with open(CONFIG_FILE, "w") as f:
-        json.dump({
-            "provider": config.provider,
-            "model": config.model,
-            "api_keys": config.api_keys,
-            "supermemory_key": config.supermemory_key,
-            "theme": config.theme,
-            "hotkey": config.hotkey,
-        }, f, indent=2)
+    data = {
+        "provider": config.provider,
+        "model": config.model,
+        "api_keys": config.api_keys,
+        "supermemory_key": config.supermemory_key,
+        "theme": config.theme,
+        "hotkey": config.hotkey,
+    }
+    if orjson:
+        CONFIG_FILE.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        CONFIG_FILE.write_text(json.dumps(data, indent=2))
 
 
 # Singleton config instance
@@ -7,19 +7,37 @@ Provides:
 - Local context loading
 """
 import os
+import re
+import time
 import uuid
+import asyncio
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel
-import uvicorn
 
 from langchain_core.messages import HumanMessage, AIMessage
-from .agent import create_agent, get_agent, reset_agent
-from .memory import read_directory_context
+
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _ResponseClass = ORJSONResponse
+except ImportError:  # Fall back to the stdlib if orjson isn't installed
+    import json
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+    _ResponseClass = JSONResponse
+from .agent import (
+    create_agent, get_agent, reset_agent, warm_up,
+    shared_checkpointer, close_shared_checkpointer,
+)
+from .memory import build_context_index, format_context_index, read_file_context, aclose_client
 from .config import api_key_context
 from .providers import (
     get_config, update_config, list_providers, 
@@ -27,15 +45,49 @@ from .providers import (
 )
 
 
-# Session storage
-sessions: dict = {}
+# Session storage, least recently used first. Sessions beyond MAX_SESSIONS
+# or idle for SESSION_IDLE_TTL seconds are dropped; their conversations stay
+# in the checkpointer and resume if the client comes back.
+sessions: OrderedDict = OrderedDict()
+MAX_SESSIONS = 1024
+SESSION_IDLE_TTL = 3600
+
+# Bumped on provider/model changes; sessions built under an older version
+# swap in the new agent on their next request instead of being dropped
+_config_version = 0
+
+# A message the client resends under the same message_id within REPEAT_TTL
+# seconds of it being answered (retry after a dropped connection) gets the
+# stored reply instead of a second agent run. Identical text under a new id
+# is a new question and always runs
+REPEAT_TTL = 60
+
+# Websocket messages arriving within this many seconds of each other (e.g.
+# several pasted lines) are answered together in one agent turn
+COALESCE_WINDOW = 0.05
+
+# Short, simple questions with no local context loaded are answered by the
+# provider's light model (see ProviderConfig.light_model)
+LIGHT_ROUTE_MAX_CHARS = 120
+_LIGHT_ROUTE_RE = re.compile(r"(what|who|when|where|how many)\b", re.IGNORECASE)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifecycle - startup and shutdown."""
     print("🧠 Ruty AI backend starting...")
+    # Open (and prune) the checkpoint database once, off the event loop;
+    # every agent rebuild reuses this saver
+    await asyncio.to_thread(shared_checkpointer)
+    # Compile the shared agent and its model client before the first request;
+    # every session reuses this graph (sessions differ only by thread_id)
+    create_agent()
+    warm_up()
+    reaper = asyncio.create_task(_reap_idle_sessions())
     yield
+    reaper.cancel()
+    await aclose_client()
+    close_shared_checkpointer()
     print("👋 Ruty AI backend shutting down...")
 
 
@@ -44,6 +96,7 @@ app = FastAPI(
     description="Personal AI assistant with memory",
     version="0.3.0",
     lifespan=lifespan,
+    default_response_class=_ResponseClass,
 )
 
 # CORS for Tauri frontend
@@ -54,6 +107,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Small bodies aren't worth the compression overhead
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 # ============== Request/Response Models ==============
@@ -64,6 +119,7 @@ class ChatRequest(BaseModel):
     session_id: str
     local_context: Optional[str] = None
     api_keys: Optional[dict] = None
+    message_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -90,18 +146,98 @@ class ProviderUpdateRequest(BaseModel):
 
 def get_or_create_session(session_id: str) -> dict:
     """Get existing session or create new one."""
-    if session_id not in sessions:
-        sessions[session_id] = {
+    session = sessions.get(session_id)
+    if session is None:
+        session = sessions[session_id] = {
             "agent": create_agent(),
+            "agent_version": _config_version,
             "config": {"configurable": {"thread_id": session_id}},
+            "light_config": {"configurable": {"thread_id": session_id, "model_tier": "light"}},
             "local_context": "",
+            "local_context_index": {},
+            "context_changed": False,
             "created_at": datetime.now().isoformat(),
         }
-    return sessions[session_id]
+        if len(sessions) > MAX_SESSIONS:
+            sessions.popitem(last=False)
+    else:
+        sessions.move_to_end(session_id)
+        if session["agent_version"] != _config_version:
+            session["agent"] = create_agent()
+            session["agent_version"] = _config_version
+    session["last_touched"] = time.monotonic()
+    return session
+
+
+async def _reap_idle_sessions():
+    """Periodically drop sessions idle for longer than SESSION_IDLE_TTL"""
+    while True:
+        await asyncio.sleep(SESSION_IDLE_TTL / 4)
+        cutoff = time.monotonic() - SESSION_IDLE_TTL
+        # Oldest first, so stop at the first session touched since the cutoff
+        while sessions and next(iter(sessions.values()))["last_touched"] < cutoff:
+            sessions.popitem(last=False)
+
+
+def _set_context(session: dict, context: str, index: Optional[dict] = None):
+    """Replace the session's local context; it goes to the agent on the next turn."""
+    session["local_context"] = context
+    session["local_context_index"] = index or {}
+    session["context_changed"] = True
+
+
+def _add_context(session: dict, input_state: dict):
+    """Add the local context to input_state only if it changed since the last turn.
+
+    The graph state keeps it between turns, so resending the same blob every
+    turn would just rewrite it into each checkpoint.
+    """
+    if session["context_changed"]:
+        input_state["local_context"] = session["local_context"]
+        input_state["local_context_index"] = session["local_context_index"]
+        session["context_changed"] = False
+
+
+def _turn_config(session: dict, messages: list) -> dict:
+    """Run config for one turn, routing trivial turns to the light model"""
+    if (
+        messages
+        and not session["local_context"]
+        and all(len(m) < LIGHT_ROUTE_MAX_CHARS and _LIGHT_ROUTE_RE.match(m.lstrip()) for m in messages)
+    ):
+        return session["light_config"]
+    return session["config"]
+
+
+def _repeated_turn(session: dict, message_ids: set):
+    """(tools_used, response) if the client-supplied message_ids were all
+    answered by the last turn, recently"""
+    last = session.get("last_turn")
+    if (
+        message_ids and last and message_ids <= last[0]
+        and time.monotonic() - last[1] < REPEAT_TTL
+    ):
+        return last[2], last[3]
+    return None
 
 
 # ============== Chat Endpoints ==============
 
+async def _assistant_steps(agent, input_state: dict, config: dict):
+    """Run one agent turn, yielding (tool_names, content) per assistant step.
+    
+    "updates" yields only each node's delta, not the whole state, and each
+    step's message is read once here. astream keeps the event loop free:
+    sync nodes and tools run in worker threads and the memory tools' async
+    versions are awaited.
+    """
+    async for event in agent.astream(input_state, config=config, stream_mode="updates"):
+        delta = event.get("assistant")
+        if not delta:
+            continue
+        message = delta["messages"][-1]
+        yield [tc["name"] for tc in message.tool_calls], message.content
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -114,47 +250,108 @@ async def chat(request: ChatRequest):
     try:
         session = get_or_create_session(request.session_id)
         agent = session["agent"]
-        config = session["config"]
         
         # Update local context if provided
         if request.local_context:
-            session["local_context"] = request.local_context
+            _set_context(session, request.local_context)
+        config = _turn_config(session, [request.message])
+        
+        message_ids = {request.message_id} if request.message_id else set()
+        repeated = _repeated_turn(session, message_ids)
+        if repeated:
+            return ChatResponse(
+                response=repeated[1],
+                tools_used=repeated[0],
+                session_id=request.session_id
+            )
         
         # Build input state
         input_state = {"messages": [HumanMessage(content=request.message)]}
-        if session["local_context"]:
-            input_state["local_context"] = session["local_context"]
+        _add_context(session, input_state)
         
         # Process with agent
-        tools_used = []
+        tools_used = {}  # Insertion-ordered set of tool names
         final_response = ""
         
         try:
-            for event in agent.stream(input_state, config=config, stream_mode="values"):
-                if "messages" in event:
-                    last_msg = event["messages"][-1]
-                    
-                    # Track tool calls
-                    if hasattr(last_msg, "tool_calls") and last_msg.tool_calls:
-                        for tc in last_msg.tool_calls:
-                            tools_used.append(tc["name"])
-                    
-                    # Capture final response (AI message without tool calls)
-                    if hasattr(last_msg, "content") and last_msg.content:
-                        if not hasattr(last_msg, "tool_calls") or not last_msg.tool_calls:
-                            final_response = last_msg.content
+            async for tool_names, content in _assistant_steps(agent, input_state, config):
+                # Track tool calls
+                if tool_names:
+                    tools_used.update(dict.fromkeys(tool_names))
+                
+                # Capture final response (AI message without tool calls)
+                elif content:
+                    final_response = content
+            session["last_turn"] = (message_ids, time.monotonic(), list(tools_used), final_response)
         except Exception as e:
             final_response = f"Error: {str(e)}"
         
         return ChatResponse(
             response=final_response,
-            tools_used=list(set(tools_used)),  # Deduplicate
+            tools_used=list(tools_used),
             session_id=request.session_id
         )
     finally:
         api_key_context.reset(token)
 
 
+async def _send_events(websocket: WebSocket, events: list):
+    """Send a list of events as one binary JSON frame"""
+    await websocket.send_bytes(_json_dumps(events))
+
+
+class _EventSender:
+    """Writes websocket events from a background task.
+    
+    push() only queues, so the agent never waits on a socket write; events
+    queued while the previous frame was being written go out together in
+    the next one.
+    """
+    
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.buffer = []
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+    
+    def push(self, *events):
+        self.buffer.extend(events)
+        self.ready.set()
+    
+    async def _run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.buffer:
+                events, self.buffer = self.buffer, []
+                await _send_events(self.websocket, events)
+            if self.closed:
+                return
+    
+    async def aclose(self):
+        """Send whatever is still queued, then stop the writer"""
+        self.closed = True
+        self.ready.set()
+        try:
+            await self.task
+        except Exception:
+            pass  # Connection already gone
+
+
+async def _receive_burst(websocket: WebSocket) -> list:
+    """Wait for one message, then collect any arriving within COALESCE_WINDOW"""
+    batch = [await websocket.receive_json()]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + COALESCE_WINDOW
+    while (remaining := deadline - loop.time()) > 0:
+        try:
+            batch.append(await asyncio.wait_for(websocket.receive_json(), timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
 @app.websocket("/ws/{session_id}")
 async def websocket_chat(websocket: WebSocket, session_id: str):
     """
@@ -162,66 +359,82 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
     Enables real-time token streaming to the frontend.
     """
     await websocket.accept()
-    session = get_or_create_session(session_id)
+    current_keys = None
+    sender = _EventSender(websocket)
     
     try:
         while True:
-            # Receive message from frontend
-            data = await websocket.receive_json()
-            message = data.get("message", "")
-            local_context = data.get("local_context", "")
-            api_keys = data.get("api_keys", {})
+            # Receive message from frontend, plus any that follow right behind it
+            batch = await _receive_burst(websocket)
+            session = get_or_create_session(session_id)  # Marks it recently used
+            messages = [d["message"] for d in batch if d.get("message")]
+            local_context = next((d["local_context"] for d in reversed(batch) if d.get("local_context")), "")
+            api_keys = batch[-1].get("api_keys", {})
+            
+            # The keys live in this connection's own context, so they only
+            # need setting when the client sends different ones
+            if api_keys != current_keys:
+                api_key_context.set(api_keys)
+                current_keys = api_keys
             
-            # Set context for this iteration
-            token = api_key_context.set(api_keys)
+            if local_context:
+                _set_context(session, local_context)
             
+            agent = session["agent"]
+            config = _turn_config(session, messages)
+            
+            message_ids = {d["message_id"] for d in batch if d.get("message_id")}
+            repeated = _repeated_turn(session, message_ids)
+            if repeated:
+                tools_used, response = repeated
+                sender.push(
+                    *({"type": "tool", "name": name} for name in tools_used),
+                    {"type": "response", "content": response},
+                    {"type": "done"},
+                )
+                continue
+            
+            # Build input state; a burst becomes consecutive user
+            # messages answered by a single LLM call
+            input_state = {"messages": [HumanMessage(content=m) for m in messages or [""]]}
+            _add_context(session, input_state)
+            
+            # Stream response; each frame carries a list of events
+            pending = []
+            tools_used = {}
+            final_response = ""
             try:
-                if local_context:
-                    session["local_context"] = local_context
-                
-                # Build input state
-                input_state = {"messages": [HumanMessage(content=message)]}
-                if session["local_context"]:
-                    input_state["local_context"] = session["local_context"]
-                
-                agent = session["agent"]
-                config = session["config"]
-                
-                # Stream response
-                try:
-                    for event in agent.stream(input_state, config=config, stream_mode="values"):
-                        if "messages" in event:
-                            last_msg = event["messages"][-1]
-                            
-                            # Send tool usage updates
-                            if hasattr(last_msg, "tool_calls") and last_msg.tool_calls:
-                                for tc in last_msg.tool_calls:
-                                    await websocket.send_json({
-                                        "type": "tool",
-                                        "name": tc["name"]
-                                    })
-                            
-                            # Send final response
-                            if hasattr(last_msg, "content") and last_msg.content:
-                                if not hasattr(last_msg, "tool_calls") or not last_msg.tool_calls:
-                                    await websocket.send_json({
-                                        "type": "response",
-                                        "content": last_msg.content
-                                    })
-                    
-                    # Signal completion
-                    await websocket.send_json({"type": "done"})
+                async for tool_names, content in _assistant_steps(agent, input_state, config):
+                    # Send one step's tool usage updates together; a tool
+                    # already reported this turn isn't sent again
+                    if tool_names:
+                        new_tools = [name for name in dict.fromkeys(tool_names) if name not in tools_used]
+                        tools_used.update(dict.fromkeys(new_tools))
+                        sender.push(*({"type": "tool", "name": name} for name in new_tools))
                     
-                except Exception as e:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": str(e)
-                    })
-            finally:
-                api_key_context.reset(token)
+                    # Final response goes out with the completion signal
+                    elif content:
+                        final_response = content
+                        pending.append({
+                            "type": "response",
+                            "content": content
+                        })
+                
+                # Signal completion
+                pending.append({"type": "done"})
+                session["last_turn"] = (message_ids, time.monotonic(), list(tools_used), final_response)
                 
+            except Exception as e:
+                pending.append({
+                    "type": "error",
+                    "message": str(e)
+                })
+            sender.push(*pending)
+            
     except WebSocketDisconnect:
         print(f"Session {session_id} disconnected")
+    finally:
+        await sender.aclose()
 
 
 # ============== Provider Management ==============
@@ -241,6 +454,7 @@ async def get_providers():
 @app.post("/providers/update")
 async def update_provider(request: ProviderUpdateRequest):
     """Update the current provider configuration."""
+    global _config_version
     config = get_config()
     
     updates = {}
@@ -260,10 +474,11 @@ async def update_provider(request: ProviderUpdateRequest):
     
     if updates:
         new_config = update_config(**updates)
-        # Reset agent to pick up new config
+        # Reset agent to pick up new config; sessions (and their local
+        # context) are kept and switch to the new agent lazily
         reset_agent()
-        # Reset all sessions to use new agent
-        sessions.clear()
+        create_agent()  # Rebuild the shared agent now, not on a user request
+        _config_version += 1
         
         return {
             "success": True,
@@ -303,12 +518,13 @@ async def load_context(request: ContextRequest):
     
     try:
         if path.is_file():
-            content = path.read_text(encoding="utf-8")
-            session["local_context"] = f"### {path.name}\n```\n{content[:5000]}\n```"
+            _set_context(session, read_file_context(path))
             return {"success": True, "loaded": path.name, "type": "file"}
         else:
-            content = read_directory_context(path)
-            session["local_context"] = content
+            # Send only a file listing; the agent reads files on demand
+            # with read_context_file
+            index = build_context_index(path)
+            _set_context(session, format_context_index(path, index), index)
             return {"success": True, "loaded": path.name, "type": "directory"}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -318,7 +534,7 @@ async def load_context(request: ContextRequest):
 async def clear_context(session_id: str):
     """Clear local context for a session"""
     session = get_or_create_session(session_id)
-    session["local_context"] = ""
+    _set_context(session, "")
     return {"success": True}
 
 
@@ -363,7 +579,14 @@ async def health_check():
 def run_server(host: str = "127.0.0.1", port: int = 3847):
     """Run the FastAPI server"""
     print(f"🧠 Ruty backend running at http://{host}:{port}")
-    uvicorn.run(app, host=host, port=port, log_level="warning")
+    import uvicorn
+    # "auto" picks uvloop and httptools whenever they are installed
+    # (uvicorn[standard]; uvloop is skipped on Windows). Websocket frames
+    # are deflated when the client negotiates permessage-deflate.
+    uvicorn.run(
+        app, host=host, port=port, loop="auto", http="auto",
+        ws_per_message_deflate=True, log_level="warning",
+    )
 
 
 if __name__ == "__main__":
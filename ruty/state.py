@@ -1,4 +1,5 @@
 """Agent state schema for LangGraph"""
+import operator
 from typing import TypedDict, Annotated
 from langgraph.graph.message import add_messages
 
@@ -9,8 +10,14 @@ class AgentState(TypedDict):
     Attributes:
         messages: Conversation history (automatically accumulated)
         local_context: Optional local file context for current session
+        local_context_index: Relative name -> path of files readable via read_context_file
         session_id: Unique identifier for the conversation session
+        summary: Running summary of messages trimmed from the context window
+        memories_saved: Set once the agent has saved a memory this session
     """
     messages: Annotated[list, add_messages]
     local_context: str
+    local_context_index: dict
     session_id: str
+    summary: str
+    memories_saved: Annotated[bool, operator.or_]
@@ -1,6 +1,6 @@
 # Ruty Tools
 from .memory import search_memory, add_memory
-from .filesystem import sync_folder, upload_file, load_local_context
+from .filesystem import sync_folder, upload_file, load_local_context, read_context_file
 from .system import list_documents, delete_document, open_url, run_shell, get_system_info
 
 ALL_TOOLS = [
@@ -11,6 +11,7 @@ ALL_TOOLS = [
     sync_folder,
     upload_file,
     load_local_context,
+    read_context_file,
     # System tools
     list_documents,
     delete_document,
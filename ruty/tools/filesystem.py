@@ -1,12 +1,17 @@
 """Filesystem tools for syncing and uploading files"""
 from pathlib import Path
+from typing import Annotated
 from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
 from ..memory import (
     sync_directory_to_supermemory,
     upload_file_to_supermemory,
     add_memory_to_supermemory,
     read_directory_context,
+    read_file_context,
+    read_context_slice,
     BINARY_EXTENSIONS,
+    LARGE_TEXT_BYTES,
 ) 
 
 @tool
@@ -35,7 +40,10 @@ def sync_folder(path: str) -> str:
     if "error" in result:
         return f"✗ {result['error']}"
     
-    return f"✓ Synced {result['synced']} files ({result['skipped']} already present)"
+    summary = f"✓ Synced {result['synced']} files ({result['skipped']} already present)"
+    if result.get("failed"):
+        summary += f", ✗ {result['failed']} failed"
+    return summary
 
 
 @tool
@@ -61,7 +69,9 @@ def upload_file(path: str) -> str:
     custom_id = f"file:{file_path.name}"
     
     try:
-        if file_path.suffix.lower() in BINARY_EXTENSIONS:
+        # Large text files are streamed from disk like binaries rather than
+        # decoded whole into a JSON body
+        if file_path.suffix.lower() in BINARY_EXTENSIONS or file_path.stat().st_size > LARGE_TEXT_BYTES:
             result = upload_file_to_supermemory(file_path, custom_id=custom_id)
         else:
             content = file_path.read_text(encoding="utf-8")
@@ -96,9 +106,45 @@ def load_local_context(path: str) -> str:
     
     if target.is_file():
         try:
-            content = target.read_text(encoding="utf-8")
-            return f"### {target.name}\n```\n{content[:5000]}\n```"
+            # Reads only the first 5000 characters, not the whole file
+            return read_file_context(target)
         except Exception as e:
             return f"✗ Error reading file: {e}"
     else:
         return read_directory_context(target)
+
+
+@tool
+def read_context_file(
+    name: str,
+    state: Annotated[dict, InjectedState],
+    offset: int = 0,
+    length: int = 4096,
+) -> str:
+    """Read part of a file from the directory loaded with /context.
+    
+    Only the file list is in context; use this to read the files you need.
+    Call again with a larger offset to continue reading a long file.
+    
+    Args:
+        name: File name exactly as shown in the local context listing
+        offset: Byte offset to start reading from
+        length: Number of bytes to read (max 16384)
+    
+    Returns:
+        The requested part of the file
+    """
+    index = state.get("local_context_index") or {}
+    file_path = index.get(name)
+    if file_path is None:
+        return f"✗ Not in local context: {name}"
+    
+    length = max(1, min(length, 16384))
+    try:
+        content = read_context_slice(file_path, max(0, offset), length)
+    except Exception as e:
+        return f"✗ Error reading file: {e}"
+    
+    if not content:
+        return f"(end of {name})"
+    return f"### {name} [offset {offset}, up to {length} bytes]\n```\n{content}\n```"
@@ -1,10 +1,42 @@
 """Memory tools for searching and adding to Supermemory"""
-from langchain_core.tools import tool
-from ..memory import search_supermemory, add_memory_to_supermemory, list_memories
+import asyncio
+import re
+import threading
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Annotated
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import StructuredTool, InjectedToolCallId
+from langgraph.types import Command
+from ..memory import (
+    search_supermemory, add_memory_to_supermemory, list_memories, get_supermemory_key,
+    asearch_supermemory, aadd_memory_to_supermemory, alist_memories,
+)
 
+# Character budget for the context returned by search_memory
+MAX_CONTEXT_CHARS = 6000
 
-@tool
-def search_memory(query: str) -> str:
+# Memory listings started ahead of a likely search_memory call, keyed by
+# Supermemory key (BYOK-safe) -> (future, started_at); each is used by at
+# most one search, and only within PREFETCH_TTL seconds
+_PREFETCH_MAX = 32
+PREFETCH_TTL = 60
+_prefetched: dict = {}
+_prefetch_lock = threading.Lock()
+
+# Runs memory listings: prefetched ones, and the one alongside the search
+# in the sync search path
+_listing_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def _start_listing():
+    """list_memories in a worker thread, in a copy of the caller's context"""
+    return _listing_executor.submit(contextvars.copy_context().run, list_memories)
+
+
+def _search_memory(query: str) -> str:
     """Search your personal knowledge base for relevant information.
     
     Use this tool to find information from your saved documents, notes, 
@@ -17,46 +49,139 @@ def search_memory(query: str) -> str:
     Returns:
         Relevant content from your knowledge base, or a message if nothing found
     """
-    context_parts = []
-    query_lower = query.lower()
-    
-    # 1. Search documents (PDFs) via search API
+    # The search and the memory listing are independent requests, so the
+    # listing (prefetched, if one is waiting) runs in a worker thread while
+    # the search runs here
+    listing = _take_prefetched() or _start_listing()
     results = search_supermemory(query, limit=5)
-    for result in results:
-        chunks = result.get("chunks", [])
-        for chunk in chunks:
-            content = chunk.get("content", "")
-            if content:
-                title = result.get("title", "")
-                context_parts.append(f"**{title}**:\n{content}" if title else content)
+    return _format_search(query, results, listing.result())
+
+
+async def _asearch_memory(query: str) -> str:
+    """Async _search_memory; the search and the memory listing run concurrently"""
+    listing = _take_prefetched()
+    results, memories = await asyncio.gather(
+        asearch_supermemory(query, limit=5),
+        asyncio.wrap_future(listing) if listing is not None else alist_memories(),
+    )
+    return _format_search(query, results, memories)
+
+
+@lru_cache(maxsize=64)
+def _keyword_pattern(query: str):
+    """Case-insensitive regex matching any word of query, or None if it has none.
+    
+    Compiled once per distinct query; a search repeated with the same query
+    reuses the pattern.
+    """
+    words = dict.fromkeys(query.lower().split())
+    if not words:
+        return None
+    return re.compile("|".join(map(re.escape, words)), re.IGNORECASE)
+
+
+def _search_candidates(query: str, results: list, memories: list):
+    """Yield (title, text) candidates for search_memory, best first.
+    
+    A generator, so the caller can stop once it has enough and the
+    remaining memories are never keyword-matched.
+    """
+    # 1. Search documents (PDFs) via search API, best-scoring chunks first
+    ranked = sorted(
+        ((result, chunk) for result in results for chunk in result.get("chunks", [])),
+        key=lambda rc: -(rc[1].get("score") or rc[0].get("score") or 0),
+    )
+    for result, chunk in ranked:
+        content = chunk.get("content", "")
+        if content:
+            yield result.get("title", ""), content
     
     # 2. Search text memories by listing and matching (since search API doesn't index them)
-    memories = list_memories()
+    keywords = _keyword_pattern(query)
+    if keywords is None:
+        return
     for mem in memories:
         if mem.get("type") == "text":
             title = mem.get("title", "")
             summary = mem.get("summary", "")
             # Simple keyword matching
-            if any(word in (title + " " + summary).lower() for word in query_lower.split()):
-                if summary:
-                    context_parts.append(f"**{title}**:\n{summary}" if title else summary)
+            if summary and (keywords.search(title) or keywords.search(summary)):
+                yield title, summary
+
+
+def _format_search(query: str, results: list, memories: list) -> str:
+    """Merge search results and keyword-matched memories into tool output"""
+    # Deduplicate overlapping chunks and cap the total size, since every
+    # character here ends up in the prompt; stop as soon as either cap is hit
+    unique_parts = {}  # fingerprint -> (title, text), in insertion order
+    total = 0
+    for title, text in _search_candidates(query, results, memories):
+        fingerprint = (title, text[:200])
+        if fingerprint in unique_parts:
+            continue
+        size = len(title) + len(text)
+        if total + size > MAX_CONTEXT_CHARS and unique_parts:
+            break
+        unique_parts[fingerprint] = (title, text)
+        total += size
+        if len(unique_parts) == 5:
+            break
     
-    if not context_parts:
+    if not unique_parts:
         return "No relevant memories found for this query."
     
-    # Deduplicate and limit
-    seen = set()
-    unique_parts = []
-    for part in context_parts:
-        if part not in seen:
-            seen.add(part)
-            unique_parts.append(part)
+    return "\n\n---\n\n".join(
+        f"**{title}**:\n{text}" if title else text for title, text in unique_parts.values()
+    )
+
+
+def prefetch_memories():
+    """Start listing memories in the background for an upcoming search.
     
-    return "\n\n---\n\n".join(unique_parts[:5])
+    Called by the agent when a user message arrives. The listing doesn't
+    depend on the query, so whatever query the model then passes to
+    search_memory picks it up instead of paying for its own; only the
+    query-dependent search request remains. Skipped without a Supermemory
+    key, and while an unclaimed listing for the same key is pending.
+    """
+    key = get_supermemory_key()
+    if not key:
+        return
+    now = time.monotonic()
+    with _prefetch_lock:
+        pending = _prefetched.get(key)
+        if pending is not None and now - pending[1] < PREFETCH_TTL:
+            return
+        _prefetched[key] = (_start_listing(), now)
+        while len(_prefetched) > _PREFETCH_MAX:
+            _prefetched.pop(next(iter(_prefetched)))
+
+
+def _take_prefetched():
+    """Claim the prefetched listing for the current key, if one is usable"""
+    with _prefetch_lock:
+        pending = _prefetched.pop(get_supermemory_key(), None)
+    if pending is None or time.monotonic() - pending[1] >= PREFETCH_TTL:
+        return None
+    future = pending[0]
+    if future.done() and future.exception() is not None:
+        return None
+    return future
+
+
+def _drop_prefetched():
+    """Forget the pending listing for the current key (it predates a write)"""
+    with _prefetch_lock:
+        _prefetched.pop(get_supermemory_key(), None)
+
+
+# Tools are built from sync/async pairs, so astream runs the async versions
+search_memory = StructuredTool.from_function(
+    func=_search_memory, coroutine=_asearch_memory, name="search_memory"
+)
 
 
-@tool
-def add_memory(content: str, title: str = "") -> str:
+def _add_memory(content: str, tool_call_id: Annotated[str, InjectedToolCallId], title: str = ""):
     """Save new information to your knowledge base.
     
     Use this tool to remember important information, notes, or insights
@@ -73,8 +198,31 @@ def add_memory(content: str, title: str = "") -> str:
         content=content,
         title=title if title else None
     )
-    
+    return _add_memory_result(result, content, title, tool_call_id)
+
+
+async def _aadd_memory(content: str, tool_call_id: Annotated[str, InjectedToolCallId], title: str = ""):
+    """_add_memory when the agent runs async (astream / astream_events)"""
+    result = await aadd_memory_to_supermemory(
+        content=content,
+        title=title if title else None
+    )
+    return _add_memory_result(result, content, title, tool_call_id)
+
+
+def _add_memory_result(result, content: str, title: str, tool_call_id: str):
+    """Tool output for an add_memory call given the API result"""
     if result:
-        return f"✓ Memory saved: {title if title else content[:50]}..."
+        # A listing started before this write wouldn't include it
+        _drop_prefetched()
+        # Flag the save in agent state so the exit path can skip extraction
+        message = f"✓ Memory saved: {title if title else content[:50]}..."
+        return Command(update={
+            "memories_saved": True,
+            "messages": [ToolMessage(message, tool_call_id=tool_call_id)],
+        })
     else:
         return "✗ Failed to save memory"
+
+
+add_memory = StructuredTool.from_function(func=_add_memory, coroutine=_aadd_memory, name="add_memory")
@@ -6,11 +6,17 @@ Provides tools for:
 - Shell command execution (sandboxed)
 """
 import os
+import re
+import asyncio
 import subprocess
 import webbrowser
-from langchain_core.tools import tool
+from functools import lru_cache
+from langchain_core.tools import StructuredTool, tool
 from ..memory import list_docs, delete_document as delete_doc_api
 
+# Documents listed by list_documents, for readability
+LIST_DOCUMENTS_SHOWN = 30
+
 
 @tool
 def list_documents() -> str:
@@ -21,7 +27,8 @@ def list_documents() -> str:
     Returns:
         List of document titles/IDs
     """
-    docs = list_docs()
+    # Fetch one past what is shown, just to know whether there are more
+    docs = list_docs(limit=LIST_DOCUMENTS_SHOWN + 1)
     
     if not docs:
         return "No documents found in your knowledge base."
@@ -31,13 +38,19 @@ def list_documents() -> str:
     if not memories:
         return "No documents found in your knowledge base."
     
-    lines = [f"Found {len(memories)} documents:"]
-    for doc in memories[:30]:  # Limit to 30 for readability
-        title = doc.get("title") or doc.get("customId") or doc.get("id", "Unknown")
-        lines.append(f"  • {title}")
-    
-    if len(memories) > 30:
-        lines.append(f"  ... and {len(memories) - 30} more")
+    total = (docs.get("pagination") or {}).get("totalItems")
+    shown = memories[:LIST_DOCUMENTS_SHOWN]
+    lines = [
+        f"Found {total or len(shown)} documents:",
+        *(
+            f"  • {doc.get('title') or doc.get('customId') or doc.get('id', 'Unknown')}"
+            for doc in shown
+        ),
+    ]
+    if total and total > len(shown):
+        lines.append(f"  ... and {total - len(shown)} more")
+    elif len(memories) > len(shown):
+        lines.append("  ... and more")
     
     return "\n".join(lines)
 
@@ -91,25 +104,73 @@ def open_url(url: str) -> str:
 
 
 # Commands that are safe to run without user confirmation
-SAFE_COMMANDS = {
+SAFE_COMMANDS = frozenset({
     "ls", "pwd", "whoami", "date", "uptime", "hostname",
     "cat", "head", "tail", "wc", "grep", "find", "which",
     "echo", "printf", "df", "free", "uname",
-}
+})
 
 # Commands that are NEVER allowed
-BLOCKED_COMMANDS = {
+BLOCKED_COMMANDS = frozenset({
     "rm", "rmdir", "dd", "mkfs", "fdisk", "mount", "umount",
     "shutdown", "reboot", "poweroff", "halt", "init",
     "passwd", "useradd", "userdel", "usermod", "groupadd",
     "chmod", "chown", "chgrp",
     "curl", "wget",  # Network operations
     "sudo", "su", "doas",  # Privilege escalation
-}
+})
 
+# A pipe into any blocked command, checked in one pass over the command line
+_PIPE_TO_BLOCKED_RE = re.compile(
+    r"\|\s*(" + "|".join(map(re.escape, sorted(BLOCKED_COMMANDS, key=len, reverse=True))) + r")\b"
+)
 
-@tool
-def run_shell(command: str) -> str:
+
+SHELL_TIMEOUT = 30
+SHELL_CWD = os.path.expanduser("~")
+
+
+def _check_command(command: str):
+    """Error message if command is not allowed, else None"""
+    # Parse the first word (the actual command)
+    parts = command.strip().split()
+    if not parts:
+        return "✗ Empty command"
+    
+    cmd_name = parts[0]
+    
+    # Check blocklist
+    if cmd_name in BLOCKED_COMMANDS:
+        return f"✗ Command '{cmd_name}' is blocked for safety reasons"
+    
+    # Check for pipe to dangerous commands
+    piped = _PIPE_TO_BLOCKED_RE.search(command)
+    if piped:
+        return f"✗ Piping to '{piped.group(1)}' is not allowed"
+    
+    # Allow output redirects (> and >>) only for safe commands
+    if ">" in command and cmd_name not in SAFE_COMMANDS:
+        return f"✗ Redirects with '{cmd_name}' are not allowed"
+    return None
+
+
+def _format_output(stdout: str, stderr: str, returncode: int) -> str:
+    """Combine a command's output streams and status into the tool result"""
+    output = stdout
+    if stderr:
+        output += f"\n[stderr]: {stderr}"
+    
+    if returncode != 0:
+        output += f"\n[exit code: {returncode}]"
+    
+    # Truncate very long output
+    if len(output) > 2000:
+        output = output[:2000] + "\n... (truncated)"
+    
+    return output if output.strip() else "✓ Command completed (no output)"
+
+
+def _run_shell(command: str) -> str:
     """Execute a shell command and return the output.
     
     Use this for system information, file operations, or automation tasks.
@@ -123,30 +184,9 @@ def run_shell(command: str) -> str:
     Returns:
         Command output or error message
     """
-    # Parse the first word (the actual command)
-    parts = command.strip().split()
-    if not parts:
-        return "✗ Empty command"
-    
-    cmd_name = parts[0]
-    
-    # Check blocklist
-    if cmd_name in BLOCKED_COMMANDS:
-        return f"✗ Command '{cmd_name}' is blocked for safety reasons"
-    
-    # Check for pipe to dangerous commands
-    if "|" in command:
-        for blocked in BLOCKED_COMMANDS:
-            if f"| {blocked}" in command or f"|{blocked}" in command:
-                return f"✗ Piping to '{blocked}' is not allowed"
-    
-    # Check for shell operators that could be dangerous
-    dangerous_ops = ["&&", "||", ";", ">", ">>", "<"]
-    for op in dangerous_ops:
-        if op in command:
-            # Allow > only for safe commands
-            if op in [">", ">>"] and cmd_name not in SAFE_COMMANDS:
-                return f"✗ Redirects with '{cmd_name}' are not allowed"
+    error = _check_command(command)
+    if error:
+        return error
     
     try:
         result = subprocess.run(
@@ -154,29 +194,74 @@ def run_shell(command: str) -> str:
             shell=True,
             capture_output=True,
             text=True,
-            timeout=30,  # 30 second timeout
-            cwd=os.path.expanduser("~"),  # Run from home directory
+            timeout=SHELL_TIMEOUT,
+            cwd=SHELL_CWD,  # Run from home directory
         )
-        
-        output = result.stdout
-        if result.stderr:
-            output += f"\n[stderr]: {result.stderr}"
-        
-        if result.returncode != 0:
-            output += f"\n[exit code: {result.returncode}]"
-        
-        # Truncate very long output
-        if len(output) > 2000:
-            output = output[:2000] + "\n... (truncated)"
-        
-        return output if output.strip() else "✓ Command completed (no output)"
+        return _format_output(result.stdout, result.stderr, result.returncode)
         
     except subprocess.TimeoutExpired:
-        return "✗ Command timed out after 30 seconds"
+        return f"✗ Command timed out after {SHELL_TIMEOUT} seconds"
     except Exception as e:
         return f"✗ Command failed: {e}"
 
 
+async def _arun_shell(command: str) -> str:
+    """_run_shell when the agent runs async: waits on the process without
+    tying up a worker thread for up to SHELL_TIMEOUT seconds"""
+    error = _check_command(command)
+    if error:
+        return error
+    
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=SHELL_CWD,  # Run from home directory
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=SHELL_TIMEOUT)
+        except asyncio.TimeoutError:
+            return f"✗ Command timed out after {SHELL_TIMEOUT} seconds"
+        finally:
+            # Timed out, or the turn was cancelled (resubmit, client gone):
+            # don't leave the shell running with nobody reading its output
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        return _format_output(
+            stdout.decode(errors="replace"), stderr.decode(errors="replace"), proc.returncode
+        )
+    except Exception as e:
+        return f"✗ Command failed: {e}"
+
+
+# Built from the sync/async pair so astream runs the non-blocking version
+run_shell = StructuredTool.from_function(func=_run_shell, coroutine=_arun_shell, name="run_shell")
+
+
+@lru_cache(maxsize=1)
+def _static_system_info() -> str:
+    """OS, machine and hostname lines; fixed for the life of the process"""
+    import platform
+    return (
+        f"OS: {platform.system()} {platform.release()}\n"
+        f"Machine: {platform.machine()}\n"
+        f"Hostname: {platform.node()}"
+    )
+
+
+@lru_cache(maxsize=1)
+def _uptime_fd():
+    """File descriptor for /proc/uptime, kept open for pread; None if unavailable"""
+    if not hasattr(os, "pread"):
+        return None
+    try:
+        return os.open("/proc/uptime", os.O_RDONLY)
+    except OSError:
+        return None
+
+
 @tool 
 def get_system_info() -> str:
     """Get basic system information.
@@ -188,18 +273,15 @@ def get_system_info() -> str:
     
     try:
         # OS info
-        import platform
-        info.append(f"OS: {platform.system()} {platform.release()}")
-        info.append(f"Machine: {platform.machine()}")
-        info.append(f"Hostname: {platform.node()}")
+        info.append(_static_system_info())
         
-        # Uptime (Linux)
-        if os.path.exists("/proc/uptime"):
-            with open("/proc/uptime", "r") as f:
-                uptime_seconds = float(f.readline().split()[0])
-                hours = int(uptime_seconds // 3600)
-                minutes = int((uptime_seconds % 3600) // 60)
-                info.append(f"Uptime: {hours}h {minutes}m")
+        # Uptime (Linux); /proc/uptime is regenerated on every read, so
+        # one pread at offset 0 on the cached fd gets the current value
+        fd = _uptime_fd()
+        if fd is not None:
+            uptime_seconds = float(os.pread(fd, 64, 0).split(b" ", 1)[0])
+            hours, rest = divmod(int(uptime_seconds), 3600)
+            info.append(f"Uptime: {hours}h {rest // 60}m")
         
     except Exception as e:
         info.append(f"(Error getting some info: {e})")
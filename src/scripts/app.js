@@ -30,19 +30,24 @@ const contextName = document.getElementById('context-name');
 const contextClear = document.getElementById('context-clear');
 const container = document.getElementById('container');
 
+const wsDecoder = new TextDecoder();
+
 /**
  * Initialize WebSocket connection for streaming
  */
 function initWebSocket() {
     ws = new WebSocket(`${WS_BASE}/ws/${sessionId}`);
+    ws.binaryType = 'arraybuffer';
 
     ws.onopen = () => {
         console.log('🔌 WebSocket connected');
     };
 
     ws.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        handleWSMessage(data);
+        // Frames are binary JSON arrays of events
+        const text = typeof event.data === 'string' ? event.data : wsDecoder.decode(event.data);
+        const data = JSON.parse(text);
+        (Array.isArray(data) ? data : [data]).forEach(handleWSMessage);
     };
 
     ws.onclose = () => {
@@ -83,12 +88,12 @@ function handleWSMessage(data) {
 /**
  * Send message via HTTP (fallback if WebSocket not available)
  */
-async function sendMessageHTTP(message) {
+async function sendMessageHTTP(message, messageId = crypto.randomUUID()) {
     try {
         const res = await fetch(`${API_BASE}/chat`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ message, session_id: sessionId, api_keys: apiKeys })
+            body: JSON.stringify({ message, session_id: sessionId, api_keys: apiKeys, message_id: messageId })
         });
 
         const data = await res.json();
@@ -110,11 +115,13 @@ async function sendMessageHTTP(message) {
  * Send message via WebSocket for streaming
  */
 function sendMessageWS(message) {
+    // Lets the server recognise a resend of this same message
+    const messageId = crypto.randomUUID();
     if (ws && ws.readyState === WebSocket.OPEN) {
-        ws.send(JSON.stringify({ message, api_keys: apiKeys }));
+        ws.send(JSON.stringify({ message, api_keys: apiKeys, message_id: messageId }));
     } else {
         // Fallback to HTTP
-        sendMessageHTTP(message);
+        sendMessageHTTP(message, messageId);
     }
 }
 
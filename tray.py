@@ -5,92 +5,290 @@ Global keyboard shortcut: Super+Space
 """
 
 import sys
-import uuid
 import os
 import socket
+import time
 
 from pathlib import Path
-from datetime import datetime
-
-from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction
-from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import QTimer, QThread, pyqtSignal
-from pynput import keyboard
 
 # IPC Configuration
 SOCKET_PATH = f"/tmp/ruty_{os.getuid()}.sock"
+# Held (flock) by the running instance for its whole lifetime
+LOCK_PATH = f"/tmp/ruty_{os.getuid()}.lock"
 
 
-class IPCServer(QThread):
-    """Background thread to listen for IPC commands"""
-    toggle_signal = pyqtSignal()
-    
-    def run(self):
-        # Remove stale socket
-        if os.path.exists(SOCKET_PATH):
+def send_toggle_command():
+    """Send toggle command to running instance"""
+    # One datagram: no connection to set up or tear down. A missing socket
+    # file or one nobody is bound to means Ruty isn't running.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as client:
+        # sendto only blocks if the running instance stopped reading and
+        # its queue is full; don't hang the hotkey on it
+        client.settimeout(0.1)
+        try:
+            client.sendto(b"toggle", SOCKET_PATH)
+        except FileNotFoundError:
+            return False
+        except ConnectionRefusedError:
+            # Left behind by an instance that died; clear it for the next one
             try:
                 os.unlink(SOCKET_PATH)
             except OSError:
                 pass
-                
-        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        try:
-            server.bind(SOCKET_PATH)
-            server.listen(1)
-            
-            while True:
-                try:
-                    conn, _ = server.accept()
-                    data = conn.recv(1024)
-                    if data == b"toggle":
-                        self.toggle_signal.emit()
-                    conn.close()
-                except Exception:
-                    break
-        except Exception as e:
-            print(f"⚠️  Could not start IPC server: {e}")
+            return False
+        except socket.timeout:
+            print("⚠️  Ruty is running but not responding")
+            return True
+    print("✓ Sent toggle command to Ruty")
+    return True
 
 
-def run_ipc_server():
-    """Start listening for toggle commands"""
-    # Create thread properly attached to main app logic
-    # We assign it to 'app' so it doesn't get garbage collected
-    app.ipc_thread = IPCServer()
-    app.ipc_thread.toggle_signal.connect(toggle_chat)
-    app.ipc_thread.start()
+def acquire_instance_lock():
+    """Take the single-instance lock; returns its fd, or None if Ruty is running.
+    
+    The fd must stay open: the kernel drops the lock when the process
+    exits, however it exits.
+    """
+    import fcntl
+    
+    fd = os.open(LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
 
 
-def send_toggle_command():
-    """Send toggle command to running instance"""
+def toggle_running_instance():
+    """Handle --toggle: poke the running instance and exit"""
+    if send_toggle_command():
+        sys.exit(0)
+    else:
+        print("❌ Ruty is not running. Start it first.")
+        sys.exit(1)
+
+
+# The hotkey runs "run-tray.sh --toggle" on every press; answer it before
+# importing Qt and the ruty package, which it doesn't need
+if __name__ == "__main__" and sys.argv[1:2] == ["--toggle"]:
+    toggle_running_instance()
+
+from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction, QShortcut
+from PyQt5.QtGui import QIcon, QKeySequence
+from PyQt5.QtCore import QTimer, QSocketNotifier
+
+
+def handle_ipc_messages(server):
+    """Read pending toggle datagrams; runs on the Qt main thread"""
+    while True:
+        try:
+            data = server.recv(64)
+        except BlockingIOError:
+            return
+        if data == b"toggle":
+            toggle_chat()
+
+
+def run_ipc_server():
+    """Start listening for toggle commands.
+    
+    The listening socket is non-blocking and watched by a QSocketNotifier,
+    so toggles are handled by the Qt event loop with no extra thread.
+    """
+    # Remove stale socket
+    if os.path.exists(SOCKET_PATH):
+        try:
+            os.unlink(SOCKET_PATH)
+        except OSError:
+            pass
+    
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
     try:
-        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        client.connect(SOCKET_PATH)
-        client.send(b"toggle")
-        client.close()
-        print("✓ Sent toggle command to Ruty")
-        return True
-    except (FileNotFoundError, ConnectionRefusedError):
-        return False
+        server.bind(SOCKET_PATH)
+        server.setblocking(False)
+    except Exception as e:
+        print(f"⚠️  Could not start IPC server: {e}")
+        server.close()
+        return
+    
+    notifier = QSocketNotifier(server.fileno(), QSocketNotifier.Read, app)
+    notifier.activated.connect(lambda _: handle_ipc_messages(server))
+    # We assign them to 'app' so they don't get garbage collected
+    app.ipc_socket = server
+    app.ipc_notifier = notifier
+
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from ruty.agent import create_agent
-from ruty.gui import create_chat_window
-
-
 
 # Global instances
 app = None
 chat_window = None
 tray_icon = None
 
+# Single-instance lock fd, kept open while the tray runs
+instance_lock = None
+
+# Seconds within which repeated toggles count as one
+TOGGLE_DEBOUNCE = 0.3
+last_toggle = 0.0
+
+
+def finish_init():
+    """Build the agent and chat window.
+    
+    Run from the event loop once the tray icon is up, since importing the
+    agent stack takes a while; toggle_chat also calls it if the user gets
+    there first.
+    """
+    global chat_window
+    if chat_window is not None:
+        return
+    
+    from ruty.agent import create_agent, get_checkpointer
+    from ruty.gui import create_chat_window
+    
+    # Initialize agent; the checkpointer is kept so cleanup() can close it
+    print("⚡ Initializing agent...")
+    app.checkpointer = get_checkpointer()
+    agent = create_agent(checkpointer=app.checkpointer)
+    
+    # Create session config
+    session_id = f"tray_session_{time.strftime('%H%M%S')}"
+    config = {"configurable": {"thread_id": session_id}}
+    
+    # Create chat window
+    print("🪟 Creating chat window...")
+    chat_window = create_chat_window(agent, config)
+    # While the window has focus Qt sees the combination itself, which also
+    # covers Wayland sessions where no global hook can
+    QShortcut(QKeySequence("Ctrl+Alt+Space"), chat_window, toggle_chat)
+    print("✅ Ruty is ready")
+
 
 def toggle_chat():
     """Show/hide the chat window"""
-    global chat_window
-    if chat_window:
-        chat_window.toggle_visibility()
+    global last_toggle
+    # One key press can arrive through both the window shortcut and a
+    # global hook; treat anything right after a toggle as the same press
+    now = time.monotonic()
+    if now - last_toggle < TOGGLE_DEBOUNCE:
+        return
+    last_toggle = now
+    
+    if chat_window is None:
+        finish_init()
+    chat_window.toggle_visibility()
+
+
+def grab_x11_hotkey():
+    """Grab Ctrl+Alt+Space on the X11 root window.
+    
+    The X server then delivers only that key combination to us, read from
+    the display socket by a QSocketNotifier, instead of every keystroke
+    waking a Python callback. Raises if Xlib is missing or another client
+    already owns the combination.
+    """
+    from Xlib import X, XK, display, error
+    
+    disp = display.Display()
+    root = disp.screen().root
+    keycode = disp.keysym_to_keycode(XK.string_to_keysym("space"))
+    modifiers = X.ControlMask | X.Mod1Mask
+    
+    # Caps Lock and Num Lock count as modifiers too, so grab every combination
+    catcher = error.CatchError(error.BadAccess)
+    for extra in (0, X.LockMask, X.Mod2Mask, X.LockMask | X.Mod2Mask):
+        root.grab_key(keycode, modifiers | extra, True, X.GrabModeAsync, X.GrabModeAsync, onerror=catcher)
+    disp.sync()
+    if catcher.get_error():
+        disp.close()
+        raise RuntimeError("Ctrl+Alt+Space is already grabbed by another application")
+    
+    # Held keys auto-repeat as release+press pairs sharing a timestamp;
+    # only a press that isn't such a repeat toggles
+    last_release = None
+    
+    def drain():
+        nonlocal last_release
+        while disp.pending_events():
+            event = disp.next_event()
+            if event.type == X.KeyRelease:
+                last_release = event.time
+            elif event.type == X.KeyPress and event.time != last_release:
+                toggle_chat()
+    
+    notifier = QSocketNotifier(disp.fileno(), QSocketNotifier.Read)
+    notifier.activated.connect(drain)
+    # Keep references so they live as long as the app
+    app.hotkey_display = disp
+    app.hotkey_notifier = notifier
+
+
+def listen_pynput_hotkey():
+    """Fallback: watch every key event with pynput for Ctrl+Alt+Space"""
+    from pynput.keyboard import Key, Listener
+    
+    # Pressed combination keys as a bitmask; other keys map to 0
+    ctrl, alt, space = 0b00011, 0b01100, 0b10000
+    bits = {Key.ctrl_l: 0b00001, Key.ctrl_r: 0b00010, Key.alt_l: 0b00100, Key.alt_r: 0b01000, Key.space: space}
+    mask = 0
+    combo_active = False
+    
+    def combo_held():
+        # Check if Ctrl+Alt+Space is pressed
+        return bool(mask & ctrl and mask & alt and mask & space)
+    
+    def on_press(key):
+        nonlocal mask, combo_active
+        mask |= bits.get(key, 0)
+        # Toggle only on the press that completes the combination; key
+        # repeat while it stays held doesn't fire again
+        held = combo_held()
+        if held and not combo_active:
+            QTimer.singleShot(0, toggle_chat)
+        combo_active = held
+    
+    def on_release(key):
+        nonlocal mask, combo_active
+        mask &= ~bits.get(key, 0)
+        combo_active = combo_held()
+    
+    # Start listener
+    app.hotkey_listener = Listener(on_press=on_press, on_release=on_release)
+    app.hotkey_listener.start()
+
+
+def cleanup():
+    """Release everything the tray holds, on quit.
+    
+    The agent thread is stopped before the checkpointer it writes to is
+    closed, and the IPC socket file is removed so the next start doesn't
+    find a stale one.
+    """
+    if chat_window is not None:
+        chat_window.agent_loop.stop()
+    checkpointer = getattr(app, "checkpointer", None)
+    if hasattr(checkpointer, "close"):
+        checkpointer.close()
+    
+    listener = getattr(app, "hotkey_listener", None)
+    if listener is not None:
+        listener.stop()
+    display = getattr(app, "hotkey_display", None)
+    if display is not None:
+        display.close()
+    
+    server = getattr(app, "ipc_socket", None)
+    if server is not None:
+        app.ipc_notifier.setEnabled(False)
+        server.close()
+        try:
+            os.unlink(SOCKET_PATH)
+        except OSError:
+            pass
 
 
 def quit_app():
@@ -102,18 +300,16 @@ def quit_app():
 
 def main():
     """Run the tray application"""
-    global app, chat_window, tray_icon
+    global app, tray_icon, instance_lock
     
     # Check for CLI arguments
     if len(sys.argv) > 1 and sys.argv[1] == "--toggle":
-        if send_toggle_command():
-            sys.exit(0)
-        else:
-            print("❌ Ruty is not running. Start it first.")
-            sys.exit(1)
+        toggle_running_instance()
     
-    # Check if already running (primitive check via socket)
-    if send_toggle_command():
+    # Check if already running; if so, toggle its window instead
+    instance_lock = acquire_instance_lock()
+    if instance_lock is None:
+        send_toggle_command()
         print("⚡ Ruty is already running. Toggled window.")
         sys.exit(0)
         
@@ -122,22 +318,11 @@ def main():
     # Create Qt application FIRST
     app = QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(False)  # Keep running when window closes
+    app.aboutToQuit.connect(cleanup)
     
     # Start IPC server (needs app to exist)
     run_ipc_server()
     
-    # Initialize agent with in-memory storage (no persistent files)
-    print("⚡ Initializing agent (in-memory)...")
-    agent = create_agent()  # Uses default MemorySaver
-    
-    # Create session config
-    session_id = f"tray_session_{datetime.now().strftime('%H%M%S')}"
-    config = {"configurable": {"thread_id": session_id}}
-    
-    # Create chat window
-    print("🪟 Creating chat window...")
-    chat_window = create_chat_window(agent, config)
-    
     # Create system tray icon with fallback
     # Try to find a suitable icon
     icon = QIcon.fromTheme("brain")
@@ -174,28 +359,15 @@ def main():
     # Register global hotkey
     print("⌨️  Registering hotkey: Ctrl+Alt+Space")
     try:
-        from pynput.keyboard import Key, Listener
-        
-        # Track pressed keys
-        current_keys = set()
-        
-        def on_press(key):
-            current_keys.add(key)
-            # Check if Ctrl+Alt+Space is pressed
-            if (Key.ctrl_l in current_keys or Key.ctrl_r in current_keys) and \
-               (Key.alt_l in current_keys or Key.alt_r in current_keys) and \
-               Key.space in current_keys:
-                QTimer.singleShot(0, toggle_chat)
-        
-        def on_release(key):
-            try:
-                current_keys.remove(key)
-            except KeyError:
-                pass
-        
-        # Start listener
-        listener = Listener(on_press=on_press, on_release=on_release)
-        listener.start()
+        # A native grab on X11; pynput elsewhere (Wayland users can bind
+        # the --toggle command below instead)
+        try:
+            if not os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"):
+                raise RuntimeError("not an X11 session")
+            grab_x11_hotkey()
+        except Exception as e:
+            print(f"   (X11 key grab unavailable: {e}; watching keys with pynput)")
+            listen_pynput_hotkey()
         print("   ✓ Hotkey registered: Ctrl+Alt+Space")
     except Exception as e:
         print(f"⚠️  Could not register hotkey: {e}")
@@ -219,6 +391,10 @@ def main():
             QSystemTrayIcon.Information, 3000
         )
     
+    # Load the agent and chat window once the event loop is running, so the
+    # tray icon shows up without waiting for it
+    QTimer.singleShot(0, finish_init)
+    
     # Run Qt event loop
     sys.exit(app.exec_())
 